@@ -0,0 +1,124 @@
+import json
+import time
+import argparse
+import itertools
+import tracemalloc
+
+import numpy as np
+
+from config import config
+from src.utils import iter_video
+from src.camera_movement_estimator import CameraMovementEstimator
+
+
+def run(video_path, num_workers=None, chunk_size=1000, overlap=10, tolerance=0.5):
+    # Sequential vs process-parallel camera movement. `tolerance` is the
+    # largest allowed per-frame difference in pixels.
+    first_frame = next(iter_video(video_path))
+    camera_movement_estimator = CameraMovementEstimator(first_frame)
+
+    start = time.perf_counter()
+    sequential = camera_movement_estimator.get_camera_movement(iter_video(video_path))
+    sequential_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = camera_movement_estimator.get_camera_movement_parallel(
+        video_path, num_workers, chunk_size, overlap
+    )
+    parallel_seconds = time.perf_counter() - start
+
+    sequential = np.asarray(sequential, dtype=np.float64).reshape(-1, 2)
+    parallel = np.asarray(parallel, dtype=np.float64).reshape(-1, 2)
+
+    if len(sequential) != len(parallel):
+        max_difference = float("inf")
+    else:
+        max_difference = float(np.abs(sequential - parallel).max(initial=0))
+
+    return {
+        "video_path": str(video_path),
+        "num_frames": len(sequential),
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "sequential_seconds": sequential_seconds,
+        "parallel_seconds": parallel_seconds,
+        "speedup": sequential_seconds / parallel_seconds,
+        "max_difference": max_difference,
+        "within_tolerance": max_difference <= tolerance,
+    }
+
+
+def time_frame_movement(frames, **estimator_args):
+    camera_movement_estimator = CameraMovementEstimator(frames[0], **estimator_args)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    camera_movement = [
+        camera_movement_estimator.get_frame_movement(frame) for frame in frames
+    ]
+    seconds = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return camera_movement, seconds, peak_bytes
+
+
+def run_buffers(video_path, num_frames=200):
+    # Microbenchmark of the per-frame hot loop on decoded frames, with and
+    # without buffer reuse
+    frames = list(itertools.islice(iter_video(video_path), num_frames))
+
+    reference, reference_seconds, reference_peak = time_frame_movement(
+        frames, reuse_buffers=False
+    )
+    camera_movement, seconds, peak = time_frame_movement(frames, reuse_buffers=True)
+
+    max_difference = float(
+        np.abs(np.asarray(reference) - np.asarray(camera_movement)).max(initial=0)
+    )
+
+    return {
+        "video_path": str(video_path),
+        "num_frames": len(frames),
+        "ms_per_frame": 1000 * reference_seconds / len(frames),
+        "ms_per_frame_reuse_buffers": 1000 * seconds / len(frames),
+        "speedup": reference_seconds / seconds,
+        "peak_traced_mb": reference_peak / 2**20,
+        "peak_traced_mb_reuse_buffers": peak / 2**20,
+        "max_difference": max_difference,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Parallel and hot loop benchmarks of camera movement"
+    )
+    parser.add_argument("--mode", choices=["parallel", "buffers"], default="parallel")
+    parser.add_argument("--video-path", default=config.SAMPLE_VID)
+    parser.add_argument("--num-frames", type=int, default=200)
+    parser.add_argument("--num-workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--output", default=None, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    if args.mode == "buffers":
+        report = run_buffers(args.video_path, args.num_frames)
+    else:
+        report = run(
+            args.video_path,
+            args.num_workers,
+            args.chunk_size,
+            args.overlap,
+            args.tolerance,
+        )
+
+    print(json.dumps(report, indent=2))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not report.get("within_tolerance", True):
+        raise SystemExit("Parallel camera movement differs from sequential")
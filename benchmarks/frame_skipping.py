@@ -0,0 +1,117 @@
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from config import config
+from src.trackers import Tracker, TrackTable
+from src.utils import get_ious, read_video
+from src.camera_movement_estimator import CameraMovementEstimator
+
+
+def track(model_path, video_frames, camera_movements, **tracker_args):
+    tracker = Tracker(model_path, **tracker_args)
+
+    start = time.perf_counter()
+    tracks = tracker.get_object_tracks(video_frames, camera_movements=camera_movements)
+    track_table = TrackTable.from_tracks(tracks)
+    if tracker.detect_every > 1:
+        track_table = tracker.interpolate_track_table(track_table)
+    seconds = time.perf_counter() - start
+
+    return track_table, seconds
+
+
+def compare(reference, track_table, object="players"):
+    # Best-IoU match of every reference box against the boxes in the same
+    # frame. Track ids are not compared, they differ between runs.
+    ious = []
+
+    for frame_num in range(reference.num_frames):
+        reference_boxes = reference.bounding_box[
+            reference.frame_rows(frame_num, object)
+        ]
+        boxes = track_table.bounding_box[track_table.frame_rows(frame_num, object)]
+
+        if len(reference_boxes) == 0:
+            continue
+        if len(boxes) == 0:
+            ious += [0.0] * len(reference_boxes)
+            continue
+
+        ious += get_ious(reference_boxes, boxes).max(axis=1).tolist()
+
+    ious = np.array(ious)
+
+    return {
+        "mean_iou": float(ious.mean()) if len(ious) else None,
+        "recall_at_0.5": float((ious >= 0.5).mean()) if len(ious) else None,
+    }
+
+
+def run(model_path, video_path, detect_every=(2, 3, 5), motion_threshold=None):
+    video_frames = read_video(video_path)
+
+    camera_movement_estimator = CameraMovementEstimator(video_frames[0])
+    camera_movements = camera_movement_estimator.get_camera_movement(video_frames)
+
+    reference, reference_seconds = track(model_path, video_frames, camera_movements)
+
+    results = [
+        {
+            "detect_every": 1,
+            "frames_per_second": len(video_frames) / reference_seconds,
+        }
+    ]
+
+    for every in detect_every:
+        track_table, seconds = track(
+            model_path,
+            video_frames,
+            camera_movements,
+            detect_every=every,
+            motion_threshold=motion_threshold,
+        )
+        results.append(
+            {
+                "detect_every": every,
+                "motion_threshold": motion_threshold,
+                "frames_per_second": len(video_frames) / seconds,
+                "speedup": reference_seconds / seconds,
+                "players": compare(reference, track_table, "players"),
+                "referees": compare(reference, track_table, "referees"),
+            }
+        )
+
+    return {
+        "video_path": str(video_path),
+        "num_frames": len(video_frames),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Accuracy/throughput of detection frame skipping"
+    )
+    parser.add_argument("--model-name", default="best.pt")
+    parser.add_argument("--video-path", default=config.SAMPLE_VID)
+    parser.add_argument("--detect-every", type=int, nargs="+", default=[2, 3, 5])
+    parser.add_argument("--motion-threshold", type=float, default=None)
+    parser.add_argument("--output", default=None, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    report = run(
+        Path(config.MODELS_DIR, args.model_name),
+        args.video_path,
+        args.detect_every,
+        args.motion_threshold,
+    )
+
+    print(json.dumps(report, indent=2))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
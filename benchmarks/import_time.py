@@ -0,0 +1,75 @@
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+
+def get_import_times(module="src.main"):
+    # Cumulative import time in seconds of every module imported by
+    # `module`, from a fresh interpreter with -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():  # header line
+            continue
+        import_times[name.strip()] = int(cumulative) / 1e6
+
+    return import_times
+
+
+def time_command(args, repeat=3):
+    # Best wall time of a fresh interpreter running `args`
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            check=True,
+        )
+        seconds.append(time.perf_counter() - start)
+
+    return min(seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cold start time of the command line and the slowest imports"
+    )
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help="Fail when `python -m src --help` takes longer",
+    )
+    args = parser.parse_args()
+
+    import_times = get_import_times(args.module)
+    print(f"Slowest imports of {args.module}:")
+    for name, seconds in sorted(import_times.items(), key=lambda x: -x[1])[: args.top]:
+        print(f"  {seconds:8.3f}s  {name}")
+
+    help_seconds = time_command(["-m", "src", "--help"], args.repeat)
+    print(f"python -m src --help: {help_seconds:.3f}s")
+
+    if args.max_seconds is not None and help_seconds > args.max_seconds:
+        raise SystemExit(
+            f"Cold start took {help_seconds:.3f}s, more than {args.max_seconds}s"
+        )
@@ -0,0 +1,244 @@
+import json
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+
+from config import config
+from src.main import (
+    add_positions,
+    add_teams_to_track_table,
+    assign_ball_acquisition,
+    draw_frame,
+)
+from src.trackers import Tracker, TrackTable
+from src.utils import read_video, save_video, StageProfiler
+from src.team_classifier import TeamClassifier, TeamCropBuffer
+from src.possession_stats import PossessionStats
+from src.camera_movement_estimator import CameraMovementEstimator
+
+from .synthetic import StubDetector, make_synthetic_video
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_pipeline(video_path, output_path, batch_size=20, trace_memory=False):
+    # The list mode pipeline of main, with a StubDetector in Tracker and
+    # every stage timed separately. With `trace_memory` the peak of
+    # tracemalloc-traced memory (numpy and OpenCV arrays included) is
+    # recorded per stage, which slows down Python-heavy stages.
+    profiler = StageProfiler()
+    traced_peak_mb = {}
+
+    @contextmanager
+    def stage(name, items):
+        if trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+
+        with profiler.stage(name, items=items) as call:
+            yield call
+
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            traced_peak_mb[name] = (peak_memory - start_memory) / 2**20
+
+    if trace_memory:
+        tracemalloc.start()
+
+    with stage("read_video", None) as call:
+        video_frames = read_video(video_path)
+        call["items"] = num_frames = len(video_frames)
+
+    with stage("get_camera_movement", num_frames):
+        camera_movement_estimator = CameraMovementEstimator(video_frames[0])
+        camera_movement_per_frame = camera_movement_estimator.get_camera_movement(
+            video_frames
+        )
+
+    with stage("get_object_tracks", num_frames):
+        tracker = Tracker(
+            "stub", batch_size=batch_size, profiler=profiler, model=StubDetector()
+        )
+        team_crops = TeamCropBuffer()
+        tracks = tracker.get_object_tracks(
+            video_frames,
+            camera_movements=camera_movement_per_frame,
+            team_crops=team_crops,
+        )
+        track_table = TrackTable.from_tracks(tracks)
+
+    # Interpolation, positions, camera adjustment, ViewTransformer and speed
+    with stage("add_positions", num_frames):
+        track_table = add_positions(
+            tracker,
+            camera_movement_estimator,
+            track_table,
+            camera_movement_per_frame,
+            profiler,
+        )
+
+    with stage("TeamClassifier", num_frames):
+        team_classifier = TeamClassifier()
+        team_classifier.assign_teams_from_crops(team_crops)
+        add_teams_to_track_table(team_classifier, track_table)
+
+    with stage("PlayerBallAssigner", num_frames):
+        team_ball_control = assign_ball_acquisition(track_table)
+        possession_stats = PossessionStats(team_ball_control)
+
+    # Frames are drawn in place, rendering holds no extra frames
+    with stage("render", num_frames):
+        tracks = track_table.to_tracks(team_classifier.team_colors)
+        output_video_frames = [
+            draw_frame(
+                tracker,
+                camera_movement_estimator,
+                frame,
+                frame_num,
+                tracks,
+                possession_stats,
+                camera_movement_per_frame,
+            )
+            for frame_num, frame in enumerate(video_frames)
+        ]
+
+    with stage("save_video", num_frames):
+        save_video(output_video_frames, str(output_path))
+
+    if trace_memory:
+        tracemalloc.stop()
+
+    report = profiler.report()
+    for name, traced_peak in traced_peak_mb.items():
+        report["stages"][name]["traced_peak_mb"] = traced_peak
+
+    return report
+
+
+def compare(report, baseline, max_slowdown=0.2):
+    # Throughput of every stage relative to a saved report. Stages more
+    # than `max_slowdown` slower than the baseline are regressions.
+    settings = ("video", "batch_size", "trace_memory")
+    if any(report.get(key) != baseline.get(key) for key in settings):
+        raise ValueError("Baseline was run with different benchmark settings")
+
+    comparison = {}
+
+    for name, stage in report["stages"].items():
+        baseline_stage = baseline["stages"].get(name)
+        if (
+            baseline_stage is None
+            or not stage["items_per_second"]
+            or not baseline_stage["items_per_second"]
+        ):
+            continue
+
+        speedup = stage["items_per_second"] / baseline_stage["items_per_second"]
+        comparison[name] = {
+            "speedup": speedup,
+            "regression": speedup < 1 - max_slowdown,
+        }
+
+    return comparison
+
+
+def run(
+    width=1920,
+    height=1080,
+    num_frames=240,
+    num_players=20,
+    batch_size=20,
+    trace_memory=False,
+):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_path = make_synthetic_video(
+            Path(temp_dir, "synthetic.avi"), width, height, num_frames, num_players
+        )
+
+        report = run_pipeline(
+            video_path, Path(temp_dir, "output.avi"), batch_size, trace_memory
+        )
+
+    report["commit"] = get_commit()
+    report["video"] = {
+        "width": width,
+        "height": height,
+        "num_frames": num_frames,
+        "num_players": num_players,
+    }
+    report["batch_size"] = batch_size
+    report["trace_memory"] = trace_memory
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-stage throughput and memory of the pipeline on a "
+        "synthetic video with a stub detector"
+    )
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--num-frames", type=int, default=240)
+    parser.add_argument("--num-players", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--trace-memory", action="store_true")
+    parser.add_argument(
+        "--output-dir",
+        default=Path(config.REPORTS_DIR, "benchmarks"),
+        help="Reports are saved here as <timestamp>_<commit>.json",
+    )
+    parser.add_argument(
+        "--compare", default=None, help="Saved report to compare throughput with"
+    )
+    parser.add_argument("--max-slowdown", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run(
+        args.width,
+        args.height,
+        args.num_frames,
+        args.num_players,
+        args.batch_size,
+        args.trace_memory,
+    )
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f), args.max_slowdown)
+
+    print(json.dumps(report["stages"], indent=2))
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = Path(
+        output_dir,
+        f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['commit']}.json",
+    )
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved report to {output_path}")
+
+    if args.compare is not None:
+        print(json.dumps(report["comparison"], indent=2))
+
+        regressions = [
+            name for name, stage in report["comparison"].items() if stage["regression"]
+        ]
+        if regressions:
+            raise SystemExit(f"Slower than {args.compare}: {', '.join(regressions)}")
@@ -0,0 +1,201 @@
+import cv2
+import numpy as np
+
+# BGR colors of the synthetic objects, the stub detector finds them by color
+TEAM_COLORS = ((0, 0, 255), (255, 0, 0))
+REFEREE_COLOR = (0, 255, 255)
+BALL_COLOR = (255, 255, 0)
+
+# Class ids of the football model
+CLASS_NAMES = {0: "ball", 1: "goalkeeper", 2: "player", 3: "referee"}
+CLASS_COLORS = {
+    0: (BALL_COLOR,),
+    2: TEAM_COLORS,
+    3: (REFEREE_COLOR,),
+}
+
+
+def make_field(width, height, rng):
+    # Striped grass with noise and line markings, textured enough for
+    # camera movement features
+    field = np.zeros((height, width, 3), dtype=np.uint8)
+    field[:] = (40, 140, 40)
+
+    stripe_width = max(width // 24, 1)
+    for x in range(0, width, 2 * stripe_width):
+        field[:, x : x + stripe_width] = (45, 155, 45)
+
+    noise = rng.integers(0, 30, (height, width, 1), dtype=np.uint8)
+    field = cv2.add(field, np.repeat(noise, 3, axis=2))
+
+    line_thickness = max(height // 300, 2)
+    for x in range(0, width, width // 8):
+        cv2.line(field, (x, 0), (x, height), (230, 230, 230), line_thickness)
+    cv2.rectangle(
+        field,
+        (line_thickness, height // 10),
+        (width - line_thickness, height - height // 10),
+        (230, 230, 230),
+        line_thickness,
+    )
+
+    return field
+
+
+def make_synthetic_video(
+    path,
+    width: int = 1920,
+    height: int = 1080,
+    num_frames: int = 240,
+    num_players: int = 20,
+    num_referees: int = 2,
+    fps: float = 24,
+    pan: int | None = None,
+    seed: int = 0,
+):
+    # Football-like clip: a panning camera over a green field with players
+    # of two teams, referees and a ball moving between players. `pan` is
+    # the largest camera offset in pixels, a tenth of the width by default.
+    rng = np.random.default_rng(seed)
+
+    if pan is None:
+        pan = width // 10
+    field = make_field(width + 2 * pan, height, rng)
+
+    player_height = max(height // 12, 12)
+    player_width = max(player_height * 2 // 5, 4)
+    ball_radius = max(height // 160, 3)
+
+    # World positions (top left corners) and colors of all people
+    num_people = num_players + num_referees
+    positions = np.column_stack(
+        [
+            rng.uniform(0, width + 2 * pan - player_width, num_people),
+            rng.uniform(height // 8, height - height // 8 - player_height, num_people),
+        ]
+    )
+    colors = [TEAM_COLORS[i % 2] for i in range(num_players)]
+    colors += [REFEREE_COLOR] * num_referees
+
+    low = np.array([0, height // 8])
+    high = np.array(
+        [width + 2 * pan - player_width, height - height // 8 - player_height]
+    )
+    velocities = rng.normal(0, 2, (num_people, 2))
+
+    ball_owner = 0
+
+    writer = cv2.VideoWriter(
+        str(path), cv2.VideoWriter_fourcc(*"XVID"), fps, (width, height)
+    )
+
+    for frame_num in range(num_frames):
+        offset = int(pan + pan * np.sin(2 * np.pi * frame_num / (4 * fps)))
+        frame = field[:, offset : offset + width].copy()
+
+        for (x, y), color in zip(positions.astype(int).tolist(), colors):
+            x -= offset
+            cv2.rectangle(
+                frame, (x, y), (x + player_width, y + player_height), color, -1
+            )
+
+        # The ball stays at the feet of a player and is passed every second
+        if frame_num % int(fps) == 0:
+            ball_owner = int(rng.integers(0, num_players))
+        ball_x, ball_y = positions[ball_owner].astype(int).tolist()
+        if frame_num % 10 != 9:  # missed detections for interpolation
+            cv2.circle(
+                frame,
+                (
+                    ball_x - offset + player_width + 2 * ball_radius,
+                    ball_y + player_height,
+                ),
+                ball_radius,
+                BALL_COLOR,
+                -1,
+            )
+
+        writer.write(frame)
+
+        velocities = np.clip(velocities + rng.normal(0, 0.5, velocities.shape), -4, 4)
+        positions = np.clip(positions + velocities, low, high)
+
+    writer.release()
+
+    return path
+
+
+class StubArray:
+    # Stands in for the torch tensors of ultralytics results
+    def __init__(self, array) -> None:
+        self.array = np.asarray(array)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+    def int(self):
+        return StubArray(self.array.astype(int))
+
+
+class StubBoxes:
+    def __init__(self, xyxy, conf, cls) -> None:
+        self.xyxy = StubArray(xyxy)
+        self.conf = StubArray(conf)
+        self.cls = StubArray(cls)
+        self.id = None
+
+
+class StubResult:
+    names = CLASS_NAMES
+
+    def __init__(self, xyxy, conf, cls) -> None:
+        self.boxes = StubBoxes(xyxy, conf, cls)
+        self.masks = None
+        self.obb = None
+
+    def __contains__(self, key):
+        return False
+
+
+class StubDetector:
+    # Replaces YOLO in Tracker for benchmarks: finds the objects of
+    # make_synthetic_video by color on a downscaled frame, so the rest of
+    # the pipeline runs without a model or GPU
+    def __init__(self, scale: int = 4, tolerance: int = 60, min_area: int = 2) -> None:
+        self.scale = scale
+        self.tolerance = tolerance
+        self.min_area = min_area
+
+    def detect(self, frame):
+        small = frame[:: self.scale, :: self.scale]
+
+        bounding_boxes, class_ids = [], []
+        for class_id, colors in CLASS_COLORS.items():
+            for color in colors:
+                color = np.array(color)
+                mask = cv2.inRange(
+                    small,
+                    np.clip(color - self.tolerance, 0, 255),
+                    np.clip(color + self.tolerance, 0, 255),
+                )
+                _, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+
+                for x, y, width, height, area in stats[1:].tolist():
+                    if area < self.min_area:
+                        continue
+                    bounding_boxes.append([x, y, x + width, y + height])
+                    class_ids.append(class_id)
+
+        bounding_boxes = np.array(bounding_boxes, dtype=np.float32).reshape(-1, 4)
+
+        return StubResult(
+            bounding_boxes * self.scale,
+            np.full(len(class_ids), 0.9, dtype=np.float32),
+            np.array(class_ids, dtype=int),
+        )
+
+    def predict(self, frames, conf=0.1, **kwargs):
+        return [self.detect(frame) for frame in frames]
@@ -0,0 +1,87 @@
+import time
+import argparse
+
+import numpy as np
+
+from src.team_classifier import TeamClassifier
+from src.team_classifier.team_classifier import get_crop_colors, get_player_crop
+
+
+def make_player_crops(num_players, seed=0):
+    # Green field crops with a jersey-colored player blob in the middle
+    rng = np.random.default_rng(seed)
+
+    NUM_COLUMNS = 25
+    num_rows = (num_players + NUM_COLUMNS - 1) // NUM_COLUMNS
+
+    frame = np.zeros((num_rows * 130, NUM_COLUMNS * 75, 3), dtype=np.uint8)
+    frame[:] = (40, 140, 40)
+
+    bounding_boxes = []
+    jersey_colors = []
+
+    for i in range(num_players):
+        width, height = rng.integers(30, 60), rng.integers(70, 120)
+        x1 = (i % NUM_COLUMNS) * 75
+        y1 = (i // NUM_COLUMNS) * 130
+        jersey_color = (0, 0, 255) if i % 2 else (255, 255, 255)
+
+        frame[y1 + 5 : y1 + height, x1 + width // 4 : x1 + 3 * width // 4] = (
+            jersey_color
+        )
+        bounding_boxes.append([x1, y1, x1 + width, y1 + height])
+        jersey_colors.append(jersey_color)
+
+    noise = rng.integers(-10, 10, frame.shape)
+    frame = np.clip(frame.astype(np.int64) + noise, 0, 255).astype(np.uint8)
+
+    return frame, bounding_boxes, np.array(jersey_colors, dtype=np.float64)
+
+
+def run(num_players=200, repeats=3):
+    frame, bounding_boxes, jersey_colors = make_player_crops(num_players)
+    team_classifier = TeamClassifier(color_method="kmeans")
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        kmeans_colors = np.array(
+            [
+                team_classifier.get_player_color(frame, bounding_box)
+                for bounding_box in bounding_boxes
+            ]
+        )
+    kmeans_time = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        crops = [
+            get_player_crop(frame, bounding_box) for bounding_box in bounding_boxes
+        ]
+        lloyd_colors = get_crop_colors(crops)
+    lloyd_time = (time.perf_counter() - start) / repeats
+
+    return {
+        "num_players": num_players,
+        "kmeans_seconds": kmeans_time,
+        "lloyd_seconds": lloyd_time,
+        "speedup": kmeans_time / lloyd_time,
+        "kmeans_mean_error": float(
+            np.abs(kmeans_colors - jersey_colors).max(axis=1).mean()
+        ),
+        "lloyd_mean_error": float(
+            np.abs(lloyd_colors - jersey_colors).max(axis=1).mean()
+        ),
+        "max_difference": float(np.abs(kmeans_colors - lloyd_colors).max()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark sklearn KMeans against batched jersey colors"
+    )
+    parser.add_argument("--num-players", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    for key, value in run(args.num_players, args.repeats).items():
+        print(f"{key}: {value}")
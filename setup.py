@@ -3,7 +3,7 @@ from setuptools import find_packages, setup
 setup(
     name="src",
     python_requires=">=3.11.0",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*", "tests", "tests.*"]),
     version="1.0.0",
     install_requires=[
         "ultralytics==8.2.22",
@@ -11,6 +11,7 @@ setup(
         "supervision==0.20.0",
         "opencv-python==4.9.0.80",
         "scikit-learn==1.5.0",
+        "scipy==1.13.1",
     ],
     extras_require={
         "dev": [
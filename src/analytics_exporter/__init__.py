@@ -0,0 +1 @@
+from .analytics_exporter import AnalyticsExporter, FORMATS
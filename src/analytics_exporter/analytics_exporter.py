@@ -0,0 +1,105 @@
+import json
+import logging
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+
+FORMATS = ("csv", "json", "parquet")
+
+
+class AnalyticsExporter:
+    # Writes the structured results of a run: every track row, per-frame
+    # ball possession and per-player metrics as tables in each of
+    # `formats`, plus a JSON summary
+    def __init__(self, save_dir, formats=("csv", "json"), fps: float = 24) -> None:
+        unknown_formats = set(formats) - set(FORMATS)
+        if unknown_formats:
+            raise ValueError(f"Unknown export formats: {sorted(unknown_formats)}")
+
+        # Fail before any work is done rather than at the end of a run
+        if "parquet" in formats and not any(
+            importlib.util.find_spec(engine) for engine in ("pyarrow", "fastparquet")
+        ):
+            raise ImportError("Parquet export needs pyarrow or fastparquet")
+
+        self.save_dir = Path(save_dir)
+        self.formats = formats
+        self.fps = fps
+
+    def get_possession(self, possession_stats):
+        import pandas as pd
+
+        possession = possession_stats.possession()
+
+        return pd.DataFrame(
+            {
+                "frame": np.arange(len(possession_stats)),
+                "team_ball_control": possession_stats.team_ball_control,
+                "team_1_possession": possession[:, 0],
+                "team_2_possession": possession[:, 1],
+            }
+        )
+
+    def get_player_metrics(self, tracks, track_table, possession_stats):
+        import pandas as pd
+
+        players = tracks[tracks["object"] == "players"]
+
+        player_metrics = players.groupby("track_id").agg(
+            team=("team", "last"),
+            num_frames=("frame", "size"),
+            first_frame=("frame", "min"),
+            last_frame=("frame", "max"),
+            distance=("distance", "max"),
+            max_speed=("speed_smoothed", "max"),
+            mean_speed=("speed_smoothed", "mean"),
+        )
+        player_metrics["seconds"] = player_metrics["num_frames"] / self.fps
+
+        player_ids, possession_seconds = possession_stats.player_possession(track_table)
+        player_metrics["possession_seconds"] = pd.Series(
+            possession_seconds, index=player_ids
+        )
+
+        return player_metrics.reset_index().rename(columns={"track_id": "player_id"})
+
+    def write_table(self, table, name):
+        for format in self.formats:
+            path = Path(self.save_dir, f"{name}.{format}")
+
+            if format == "csv":
+                table.to_csv(path, index=False)
+            elif format == "json":
+                table.to_json(path, orient="records")
+            else:
+                table.to_parquet(path, index=False)
+
+    def export(self, track_table, possession_stats):
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+
+        tracks = track_table.to_dataframe()
+        possession = self.get_possession(possession_stats)
+        player_metrics = self.get_player_metrics(tracks, track_table, possession_stats)
+
+        self.write_table(tracks, "tracks")
+        self.write_table(possession, "possession")
+        self.write_table(player_metrics, "players")
+
+        final_possession = (
+            possession_stats.frame_possession(len(possession_stats) - 1).tolist()
+            if len(possession_stats)
+            else [0.0, 0.0]
+        )
+        summary = {
+            "num_frames": track_table.num_frames,
+            "num_players": len(player_metrics),
+            "team_1_possession": final_possession[0],
+            "team_2_possession": final_possession[1],
+        }
+        with open(Path(self.save_dir, "summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+
+        logging.info("Saved analytics to %s", self.save_dir)
+
+        return summary
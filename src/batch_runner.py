@@ -0,0 +1,210 @@
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import config
+from src.main import main, setup_logging
+from src.trackers import Tracker
+from src.analytics_exporter import FORMATS
+
+VIDEO_SUFFIXES = (".mp4", ".avi", ".mov", ".mkv")
+
+# Tracker of a worker process, loaded once and reused for every video
+_tracker = None
+
+
+def get_video_paths(source):
+    # Videos of a directory, or of a manifest file listing one path per
+    # line (relative to the manifest, "#" starts a comment)
+    source = Path(source)
+
+    if source.is_dir():
+        video_paths = sorted(
+            path for path in source.iterdir() if path.suffix.lower() in VIDEO_SUFFIXES
+        )
+    else:
+        with open(source) as f:
+            lines = [line.split("#", 1)[0].strip() for line in f]
+        video_paths = [Path(source.parent, line) for line in lines if line]
+
+    video_paths = [path.resolve() for path in video_paths]
+
+    # Reports are named after the videos
+    names = [path.stem for path in video_paths]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate video names: {duplicates}")
+
+    return video_paths
+
+
+def read_job_log(job_log_path):
+    # Last entry of every video in the job log
+    jobs = {}
+
+    if not Path(job_log_path).exists():
+        return jobs
+
+    with open(job_log_path) as f:
+        for line in f:
+            # A line cut short by a crash is ignored
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            jobs[job["video_path"]] = job
+
+    return jobs
+
+
+def append_job_log(job_log_path, job):
+    with open(job_log_path, "a") as f:
+        f.write(json.dumps(job) + "\n")
+
+
+def _init_worker(model_path, tracker_args, log_level):
+    global _tracker
+
+    setup_logging(level=log_level)
+    _tracker = Tracker(model_path, **tracker_args)
+
+
+def _process_video(video_path, save_dir, main_args):
+    start = time.perf_counter()
+    main(video_path=str(video_path), save_dir=save_dir, tracker=_tracker, **main_args)
+
+    return time.perf_counter() - start
+
+
+def run_batch(
+    source,
+    output_dir=None,
+    model_name: str = "best.pt",
+    num_processes: int | None = 2,
+    tracker_args=None,
+    retry_failed: bool = False,
+    log_level=logging.INFO,
+    **main_args,
+):
+    # Runs main on every video of `source` across a process pool. Every
+    # worker loads the model once and reuses it for all its videos. Each
+    # video gets a report directory `output_dir/<video name>`, and finished
+    # videos are appended to `output_dir/jobs.jsonl`, so an interrupted
+    # batch picks up where it stopped when run again. Failed videos are
+    # only retried with `retry_failed`.
+    video_paths = get_video_paths(source)
+
+    if output_dir is None:
+        output_dir = Path(config.REPORTS_DIR, "batch", Path(source).stem)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    job_log_path = Path(output_dir, "jobs.jsonl")
+    jobs = read_job_log(job_log_path)
+
+    skip_statuses = {"done"} if retry_failed else {"done", "failed"}
+    pending_paths = [
+        path
+        for path in video_paths
+        if jobs.get(str(path), {}).get("status") not in skip_statuses
+    ]
+    logging.info(
+        "Processing %d of %d videos, %d already in %s",
+        len(pending_paths),
+        len(video_paths),
+        len(video_paths) - len(pending_paths),
+        job_log_path,
+    )
+
+    if not pending_paths:
+        return jobs
+
+    with ProcessPoolExecutor(
+        max_workers=min(num_processes or len(pending_paths), len(pending_paths)),
+        initializer=_init_worker,
+        initargs=(
+            Path(config.MODELS_DIR, model_name),
+            tracker_args or {},
+            log_level,
+        ),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _process_video,
+                video_path,
+                Path(output_dir, video_path.stem),
+                main_args,
+            ): video_path
+            for video_path in pending_paths
+        }
+
+        for future in as_completed(futures):
+            video_path = futures[future]
+            job = {
+                "video_path": str(video_path),
+                "save_dir": str(Path(output_dir, video_path.stem)),
+            }
+
+            try:
+                job.update(status="done", seconds=future.result())
+                logging.info("Finished %s", video_path)
+            except Exception as e:
+                job.update(status="failed", error=repr(e))
+                logging.exception("Failed %s", video_path)
+
+            append_job_log(job_log_path, job)
+            jobs[str(video_path)] = job
+
+    return jobs
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Football analysis of many videos")
+    parser.add_argument("source", help="Directory of videos or manifest file")
+    parser.add_argument("--output-dir", default=None)
+    parser.add_argument("--model-name", default="best.pt")
+    parser.add_argument("--num-processes", type=int, default=2)
+    parser.add_argument("--retry-failed", action="store_true")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--team-voting", action="store_true")
+    parser.add_argument("--batch-size", default="20")
+    parser.add_argument("--detect-every", type=int, default=1)
+    parser.add_argument("--motion-threshold", type=float, default=None)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument(
+        "--export-formats", nargs="+", choices=FORMATS, default=["csv", "json"]
+    )
+    args = parser.parse_args()
+
+    setup_logging(level=logging.INFO)
+    jobs = run_batch(
+        args.source,
+        output_dir=args.output_dir,
+        model_name=args.model_name,
+        num_processes=args.num_processes,
+        retry_failed=args.retry_failed,
+        tracker_args={
+            "batch_size": (
+                args.batch_size if args.batch_size == "auto" else int(args.batch_size)
+            ),
+            "detect_every": args.detect_every,
+            "motion_threshold": args.motion_threshold,
+        },
+        streaming=args.streaming,
+        team_voting=args.team_voting,
+        use_cache=not args.no_cache,
+        headless=args.headless,
+        export_formats=tuple(args.export_formats),
+    )
+
+    failed = [job for job in jobs.values() if job["status"] == "failed"]
+    if failed:
+        raise SystemExit(f"{len(failed)} videos failed, see the job log")
+
+
+if __name__ == "__main__":
+    cli()
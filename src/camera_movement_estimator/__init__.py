@@ -1 +1,5 @@
-from .camera_movement_estimator import CameraMovementEstimator
+from .camera_movement_estimator import (
+    CameraMovementEstimator,
+    save_camera_movement,
+    load_camera_movement,
+)
@@ -1,17 +1,81 @@
 import os
 import pickle
+import itertools
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
 import numpy as np
 
-from src.utils import measure_distance, measure_xy_distance
+from src.utils import hash_source, iter_video, get_frame_count, blend_rectangle
+
+
+def save_camera_movement(path, camera_movement_per_frame, dtype=np.float32):
+    # (num_frames, 2) array in .npy format
+    np.save(path, np.asarray(camera_movement_per_frame, dtype=dtype).reshape(-1, 2))
+
+
+def load_camera_movement(path, frames=None, mmap=True):
+    # Reads a (start, stop) range of frames from a file written by
+    # save_camera_movement, as a copy-on-write memory map with `mmap`
+    camera_movement_per_frame = np.load(path, mmap_mode="c" if mmap else None)
+
+    if frames is not None:
+        start, stop = frames
+        camera_movement_per_frame = camera_movement_per_frame[start:stop]
+
+    return camera_movement_per_frame
+
+
+def _save_cache_chunk(path, camera_movement):
+    # Full precision, cached runs must match uncached ones exactly
+    save_camera_movement(
+        Path(path, "camera_movement.npy"), camera_movement, dtype=np.float64
+    )
+
+
+def _load_cache_chunk(path):
+    return load_camera_movement(Path(path, "camera_movement.npy"), mmap=False).tolist()
+
+
+def _get_chunk_camera_movement(estimator, video_path, start, stop, overlap):
+    # Worker of get_camera_movement_parallel. Decodes its own frames and
+    # starts `overlap` frames early so the tracked features have settled by
+    # the first frame of the chunk.
+    warmup_start = max(0, start - overlap)
+    camera_movement = estimator.get_camera_movement(
+        iter_video(video_path, warmup_start, stop)
+    )
+
+    return camera_movement[start - warmup_start :]
 
 
 class CameraMovementEstimator:
-    def __init__(self, frame):
+    def __init__(
+        self,
+        frame,
+        method: str = "median",
+        scale: float = 0.5,
+        reuse_buffers: bool = True,
+    ):
 
         self.minimum_distance = 5
 
+        # Global shift between two frames from the tracked features: "median"
+        # displacement, "affine" for a RANSAC partial affine fit or "max" for
+        # the single largest displacement. Optical flow runs on grayscale
+        # frames downscaled by `scale`.
+        self.method = method
+        self.scale = scale
+
+        # Allocation-free hot loop: grayscale frames go into two preallocated
+        # buffers used in turn. Buffers only span the columns around the
+        # feature mask and only those columns are converted, so corner
+        # detection and optical flow pyramids cover a smaller image. Feature
+        # positions are then relative to the span, which cancels out in
+        # the movement.
+        self.reuse_buffers = reuse_buffers
+
         self.lk_params = dict(
             winSize=(15, 15),
             maxLevel=2,
@@ -22,6 +86,7 @@ class CameraMovementEstimator:
         mask_features = np.zeros_like(first_frame_grayscale)
         mask_features[:, 0:20] = 1
         mask_features[:, 900:1050] = 1
+        mask_features = self.downscale(mask_features, cv2.INTER_NEAREST)
 
         self.features = dict(
             maxCorners=100,
@@ -30,95 +95,329 @@ class CameraMovementEstimator:
             blockSize=7,
             mask=mask_features,
         )
+        self.roi_columns = self.get_roi_columns(mask_features)
+        self.roi_start, self.roi_stop = (
+            (self.roi_columns[0][0], self.roi_columns[-1][1])
+            if self.roi_columns
+            else (0, mask_features.shape[1])
+        )
+        self.roi_features = dict(
+            self.features, mask=mask_features[:, self.roi_start : self.roi_stop]
+        )
+
+        self.reset()
 
     def add_adjust_positions_to_tracks(self, tracks, camera_movement_per_frame):
+        camera_movement_per_frame = np.asarray(
+            camera_movement_per_frame, dtype=np.float32
+        ).reshape(-1, 2)
+
         for object, object_tracks in tracks.items():
+            frame_nums, track_infos = [], []
             for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    position = track_info["position"]
-                    camera_movement = camera_movement_per_frame[frame_num]
-                    position_adjusted = (
-                        position[0] - camera_movement[0],
-                        position[1] - camera_movement[1],
-                    )
-                    tracks[object][frame_num][track_id][
-                        "position_adjusted"
-                    ] = position_adjusted
-
-    def get_camera_movement(self, frames, read_from_stub=False, stub_path=None):
+                for track_info in track.values():
+                    frame_nums.append(frame_num)
+                    track_infos.append(track_info)
+
+            if not track_infos:
+                continue
+
+            positions = np.array([track_info["position"] for track_info in track_infos])
+            positions_adjusted = positions - camera_movement_per_frame[frame_nums]
+
+            for track_info, position_adjusted in zip(
+                track_infos, positions_adjusted.tolist()
+            ):
+                track_info["position_adjusted"] = tuple(position_adjusted)
+
+    def add_adjust_positions_to_track_table(
+        self, track_table, camera_movement_per_frame
+    ):
+        camera_movement_per_frame = np.asarray(
+            camera_movement_per_frame, dtype=np.float32
+        ).reshape(-1, 2)
+
+        track_table.position_adjusted = (
+            track_table.position - camera_movement_per_frame[track_table.frame]
+        )
+
+    def reset(self):
+        self.old_gray = None
+        self.old_features = None
+
+        self.gray_buffers = None
+        self.full_gray = None
+        self.buffer_index = 0
+
+    def get_roi_columns(self, mask_features):
+        # Column ranges of the downscaled frame that feature detection and
+        # optical flow look at: the mask strips widened by the optical flow
+        # search radius
+        width = mask_features.shape[1]
+        margin = self.lk_params["winSize"][0] * 2 ** self.lk_params["maxLevel"]
+
+        columns = np.flatnonzero(mask_features.any(axis=0))
+        if len(columns) == 0:
+            return []
+
+        breaks = np.flatnonzero(np.diff(columns) > 1)
+        starts = columns[np.concatenate([[0], breaks + 1])] - margin
+        stops = columns[np.concatenate([breaks, [len(columns) - 1]])] + 1 + margin
+
+        roi_columns = []
+        for start, stop in zip(
+            starts.clip(0, width).tolist(), stops.clip(0, width).tolist()
+        ):
+            if roi_columns and start <= roi_columns[-1][1]:
+                roi_columns[-1] = (roi_columns[-1][0], stop)
+            else:
+                roi_columns.append((start, stop))
+
+        return roi_columns
+
+    def get_frame_gray(self, frame):
+        if not self.reuse_buffers:
+            return self.downscale(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+
+        height, width = self.roi_features["mask"].shape
+
+        if self.gray_buffers is None:
+            self.gray_buffers = [np.zeros((height, width), np.uint8) for _ in range(2)]
+            if self.scale != 1:
+                self.full_gray = np.zeros(frame.shape[:2], np.uint8)
+
+        # The other buffer holds the previous frame
+        frame_gray = self.gray_buffers[self.buffer_index]
+        self.buffer_index = 1 - self.buffer_index
+
+        for start, stop in self.roi_columns:
+            gray = frame_gray[:, start - self.roi_start : stop - self.roi_start]
+
+            if self.scale == 1:
+                cv2.cvtColor(frame[:, start:stop], cv2.COLOR_BGR2GRAY, dst=gray)
+                continue
+
+            full_start = int(round(start / self.scale))
+            full_stop = min(int(round(stop / self.scale)), frame.shape[1])
+            full_gray = self.full_gray[:, full_start:full_stop]
+
+            cv2.cvtColor(
+                frame[:, full_start:full_stop], cv2.COLOR_BGR2GRAY, dst=full_gray
+            )
+            cv2.resize(
+                full_gray,
+                (stop - start, height),
+                dst=gray,
+                interpolation=cv2.INTER_AREA,
+            )
+
+        return frame_gray
+
+    def downscale(self, image, interpolation=cv2.INTER_AREA):
+        if self.scale == 1:
+            return image
+
+        return cv2.resize(
+            image, None, fx=self.scale, fy=self.scale, interpolation=interpolation
+        )
+
+    def estimate_movement(self, old_points, new_points, status):
+        # (N, 2) feature positions in two frames -> (x, y) camera movement,
+        # as old minus new position
+        displacements = old_points - new_points
+
+        if self.method == "max":
+            distances = np.hypot(displacements[:, 0], displacements[:, 1])
+            return displacements[distances.argmax()]
+
+        # Features lost by optical flow are left out of the robust estimates
+        tracked = status.reshape(-1) == 1
+        old_points, new_points = old_points[tracked], new_points[tracked]
+        displacements = displacements[tracked]
+
+        if len(displacements) == 0:
+            return np.zeros(2, dtype=np.float32)
+
+        if self.method == "affine" and len(displacements) >= 3:
+            matrix, _ = cv2.estimateAffinePartial2D(
+                new_points, old_points, method=cv2.RANSAC
+            )
+            if matrix is not None:
+                displacements = new_points @ matrix[:, :2].T + matrix[:, 2] - new_points
+
+        return np.median(displacements, axis=0)
+
+    def get_frame_movement(self, frame):
+        # Streaming variant of get_camera_movement, call once per frame in order
+        frame_gray = self.get_frame_gray(frame)
+        features = self.roi_features if self.reuse_buffers else self.features
+
+        if self.old_gray is None or self.old_features is None:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(
+                frame_gray, **features
+            )  # find corners
+            return [0, 0]
+
+        new_features, status, _ = cv2.calcOpticalFlowPyrLK(
+            self.old_gray, frame_gray, self.old_features, None, **self.lk_params
+        )  # track corner points
+
+        movement = (
+            self.estimate_movement(
+                self.old_features.reshape(-1, 2), new_features.reshape(-1, 2), status
+            )
+            / self.scale
+        )
+
+        camera_movement = [0, 0]
+
+        if np.hypot(*movement) > self.minimum_distance:
+            camera_movement = movement.tolist()
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, **features)
+
+        # Frames are freshly converted or in a buffer that is only reused
+        # after the next frame, so no copy is needed
+        self.old_gray = frame_gray
+
+        return camera_movement
+
+    def get_cache_key(self):
+        features = {key: value for key, value in self.features.items() if key != "mask"}
+        return {
+            "code": hash_source(CameraMovementEstimator),
+            "minimum_distance": self.minimum_distance,
+            "method": self.method,
+            "scale": self.scale,
+            "reuse_buffers": self.reuse_buffers,
+            "lk_params": self.lk_params,
+            "features": features,
+            "frame_shape": self.features["mask"].shape,
+        }
+
+    def get_state(self):
+        old_gray = None if self.old_gray is None else self.old_gray.copy()
+        return old_gray, self.old_features
+
+    def set_state(self, state):
+        self.old_gray, self.old_features = state
+
+    def iter_camera_movement(self, frames, cache=None):
+        # Yields (frame, camera_movement). With a StageCacheView, chunks of
+        # frames are read from the cache and only uncached ones are processed.
+        self.reset()
+
+        def process(frames):
+            for frame in frames:
+                yield frame, self.get_frame_movement(frame)
+
+        if cache is None:
+            yield from process(frames)
+        else:
+            yield from cache.iter_chunks(
+                frames,
+                process,
+                self.get_state,
+                self.set_state,
+                _save_cache_chunk,
+                _load_cache_chunk,
+            )
+
+    def get_camera_movement(
+        self, frames, read_from_stub=False, stub_path=None, cache=None
+    ):
         # Read the stub
         if read_from_stub and stub_path is not None and os.path.exists(stub_path):
+            if not str(stub_path).endswith(".pkl"):
+                return load_camera_movement(stub_path)
+
             with open(stub_path, "rb") as f:
                 return pickle.load(f)
 
-        camera_movement = [[0, 0]] * len(frames)
+        camera_movement = [
+            movement for _, movement in self.iter_camera_movement(frames, cache)
+        ]
+
+        if stub_path is not None:
+            if not str(stub_path).endswith(".pkl"):
+                save_camera_movement(stub_path, camera_movement)
+            else:
+                with open(stub_path, "wb") as f:
+                    pickle.dump(camera_movement, f)
 
-        old_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(
-            old_gray, **self.features
-        )  # find corners
+        return camera_movement
 
-        for frame_num in range(1, len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num], cv2.COLOR_BGR2GRAY)
-            new_features, _, _ = cv2.calcOpticalFlowPyrLK(
-                old_gray, frame_gray, old_features, None, **self.lk_params
-            )  # track corner points
+    def get_camera_movement_parallel(
+        self, video_path, num_workers=None, chunk_size=1000, overlap=10, cache=None
+    ):
+        # get_camera_movement split into chunks of `chunk_size` frames, each
+        # estimated in a separate process. Every chunk is tracked from
+        # `overlap` frames before it, and the warm-up movements are dropped
+        # when the chunks are joined. Features are re-detected whenever the
+        # camera moves, so results match the sequential ones except for
+        # frames right after a chunk boundary where the camera has been
+        # still for longer than `overlap` frames.
+        #
+        # With a StageCacheView every chunk is cached on its own, chunks do
+        # not depend on each other. The view must not be shared with
+        # get_camera_movement, results differ from the sequential ones.
+        frame_count = get_frame_count(video_path)
+        starts = list(range(0, max(frame_count, 1), chunk_size))
 
-            max_distance = 0
+        # The frame count is approximate, the last chunk reads to the end
+        stops = starts[1:] + [None]
 
-            camera_movement_x, camera_movement_y = 0, 0
+        chunks = [None] * len(starts)
+        if cache is not None:
+            for chunk_num in range(len(starts)):
+                cached = cache.get(chunk_num, _load_cache_chunk)
+                if cached is not None:
+                    chunks[chunk_num], _ = cached
 
-            for i, (new, old) in enumerate(zip(new_features, old_features)):
-                new_features_point = new.ravel()
-                old_features_point = old.ravel()
+        pending = [chunk_num for chunk_num, chunk in enumerate(chunks) if chunk is None]
+        if pending:
+            with ProcessPoolExecutor(max_workers=num_workers) as pool:
+                computed = pool.map(
+                    _get_chunk_camera_movement,
+                    itertools.repeat(self),
+                    itertools.repeat(video_path),
+                    [starts[chunk_num] for chunk_num in pending],
+                    [stops[chunk_num] for chunk_num in pending],
+                    itertools.repeat(overlap),
+                )
 
-                distance = measure_distance(new_features_point, old_features_point)
+                for chunk_num, chunk in zip(pending, computed):
+                    chunks[chunk_num] = chunk
+                    if cache is not None:
+                        cache.put(chunk_num, _save_cache_chunk, chunk, None)
 
-                if distance > max_distance:
-                    max_distance = distance
-                    camera_movement_x, camera_movement_y = measure_xy_distance(
-                        old_features_point, new_features_point
-                    )
+        return [movement for chunk in chunks for movement in chunk]
 
-            if max_distance > self.minimum_distance:
-                camera_movement[frame_num] = [camera_movement_x, camera_movement_y]
-                old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
+    def draw_frame_camera_movement(self, frame, camera_movement):
+        # Draws in place on `frame`
+        alpha = 0.6  # for transparency
+        blend_rectangle(frame, (0, 0), (500, 100), (255, 255, 255), alpha)
 
-            old_gray = frame_gray.copy()
+        x_movement, y_movement = camera_movement
 
-        if stub_path is not None:
-            with open(stub_path, "wb") as f:
-                pickle.dump(camera_movement, f)
+        cv2.putText(
+            frame,
+            f"Camera Movement: ({x_movement:.2f}, {y_movement:.2f})",
+            (10, 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1,
+            (0, 0, 0),
+            2,
+        )
 
-        return camera_movement
+        return frame
 
     def draw_camera_movement(self, frames, camera_movement_per_frame):
         output_frames = []
 
         for frame_num, frame in enumerate(frames):
-            frame = frame.copy()
-
-            overlay = frame.copy()
-            cv2.rectangle(
-                overlay,
-                (0, 0),
-                (500, 100),
-                (255, 255, 255),
-                -1,
-            )
-            alpha = 0.6  # for transparency
-            cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-
-            x_movement, y_movement = camera_movement_per_frame[frame_num]
-
-            cv2.putText(
-                frame,
-                f"Camera Movement: ({x_movement:.2f}, {y_movement:.2f})",
-                (10, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                (0, 0, 0),
-                2,
+            frame = self.draw_frame_camera_movement(
+                frame.copy(), camera_movement_per_frame[frame_num]
             )
 
             output_frames.append(frame)
@@ -0,0 +1,41 @@
+import pickle
+import logging
+import argparse
+from pathlib import Path
+
+from src.trackers import TrackTable
+from src.camera_movement_estimator import save_camera_movement
+
+
+def convert_stub(stub_path, output_path=None):
+    # One-shot conversion of a pickle stub to the columnar format: track
+    # stubs become a TrackTable directory (.tracks), camera movement stubs
+    # an .npy file. Only convert stubs from a trusted source.
+    stub_path = Path(stub_path)
+
+    with open(stub_path, "rb") as f:
+        stub = pickle.load(f)
+
+    if isinstance(stub, dict):
+        output_path = output_path or stub_path.with_suffix(".tracks")
+        TrackTable.from_tracks(stub).save(output_path)
+    else:
+        output_path = output_path or stub_path.with_suffix(".npy")
+        save_camera_movement(output_path, stub)
+
+    logging.info("Converted %s to %s", stub_path, output_path)
+
+    return output_path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Convert pickle track/camera movement stubs"
+    )
+    parser.add_argument("stub_paths", nargs="+")
+    args = parser.parse_args()
+
+    for stub_path in args.stub_paths:
+        convert_stub(stub_path)
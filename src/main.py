@@ -1,118 +1,680 @@
 import logging
+import argparse
+import itertools
 from pathlib import Path
 from datetime import datetime
 
-import cv2
 import numpy as np
 
 from config import config
-from src.trackers import Tracker
-from src.utils import save_video, read_video
-from src.team_classifier import TeamClassifier
+from src.trackers import Tracker, TrackTable
+from src.utils import (
+    save_video,
+    read_video,
+    iter_video,
+    hash_file,
+    StageCache,
+    StagedExecutor,
+    StageProfiler,
+    VideoSource,
+    profile_stage,
+)
+from src.team_classifier import TeamClassifier, TeamCropBuffer
 from src.view_transformer import ViewTransformer
+from src.possession_stats import PossessionStats
+from src.speed_and_distance_estimator import SpeedAndDistanceEstimator
+from src.analytics_exporter import AnalyticsExporter, FORMATS
 from src.player_ball_assigner import PlayerBallAssigner
 from src.camera_movement_estimator import CameraMovementEstimator
 
+# Chunking of the parallel camera movement, results depend on it
+PARALLEL_CAMERA_MOVEMENT = {"chunk_size": 1000, "overlap": 10}
+
 
 # Configure logging
 def setup_logging(level=logging.DEBUG):
     logging.basicConfig(level=level, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
-def main(model_name: str = "best.pt", video_path: str = config.SAMPLE_VID):
+def assign_player_teams(team_classifier, video_frames, track_table):
+    team_classifier.assign_team_color(
+        video_frames[0], track_table.frame_tracks(0)["players"], frame_num=0
+    )
+
+    # A player's team is decided the first time it is seen, so only the
+    # first row of every track needs to be classified, batched per frame.
+    player_rows = track_table.object_rows("players")
+    player_ids = track_table.track_id[player_rows]
+    _, first_rows = np.unique(player_ids, return_index=True)
 
-    report_name = datetime.now().strftime("%Y%m%d_%H%M%S")
+    first_rows = player_rows[first_rows]
+    first_frames = track_table.frame[first_rows]
+
+    for frame_num in np.unique(first_frames).tolist():
+        rows = first_rows[first_frames == frame_num]
+        player_detections = {
+            player_id: {"bounding_box": bounding_box}
+            for player_id, bounding_box in zip(
+                track_table.track_id[rows].tolist(), track_table.bounding_box[rows]
+            )
+        }
+        team_classifier.get_player_teams(
+            video_frames[frame_num], player_detections, frame_num
+        )
+
+    add_teams_to_track_table(team_classifier, track_table)
 
-    save_dir = Path(config.REPORTS_DIR, report_name)
-    save_dir.mkdir(parents=True, exist_ok=True)
 
-    # Read Video
-    video_frames = read_video(video_path)
+def add_teams_to_track_table(team_classifier, track_table):
+    player_rows = track_table.object_rows("players")
+    player_ids = track_table.track_id[player_rows]
+    unique_player_ids = np.unique(player_ids)
 
-    # Initialize Tracker
-    model_path = Path(config.MODELS_DIR, model_name)
-    tracker = Tracker(model_path)
-    tracks = tracker.get_object_tracks(
-        video_frames,
-        read_from_stub=True,
-        stub_path=Path(config.STUB_DIR, "track_stubs.pkl"),
+    teams = np.array(
+        [
+            team_classifier.player_team_dict[player_id]
+            for player_id in unique_player_ids.tolist()
+        ],
+        dtype=np.int8,
     )
 
-    # Get object positions
-    tracker.add_position_to_tracks(tracks)
+    track_table.team[player_rows] = teams[
+        np.searchsorted(unique_player_ids, player_ids)
+    ]
 
-    # Camera Movement Estimator
-    camera_movement_estimator = CameraMovementEstimator(video_frames[0])
-    camera_movement_per_frame = camera_movement_estimator.get_camera_movement(
-        video_frames,
-        read_from_stub=True,
-        stub_path=Path(config.STUB_DIR, "camera_movement_stubs.pkl"),
+
+def assign_player_teams_voting(
+    team_classifier, video_frames, track_table, num_sample_frames=10
+):
+    # Learn team colors from players in frames sampled across the whole
+    # video, then let every track vote over a sliding window
+    sample_frames = np.unique(
+        np.linspace(0, track_table.num_frames - 1, num_sample_frames).astype(int)
+    ).tolist()
+    team_classifier.assign_team_color_from_frames(
+        [video_frames[frame_num] for frame_num in sample_frames],
+        [track_table.frame_tracks(frame_num)["players"] for frame_num in sample_frames],
+        sample_frames,
     )
 
-    #
-    camera_movement_estimator.add_adjust_positions_to_tracks(
-        tracks, camera_movement_per_frame
+    for frame_num in range(track_table.num_frames):
+        rows = track_table.frame_rows(frame_num, "players")
+        player_ids = track_table.track_id[rows].tolist()
+        player_detections = {
+            player_id: {"bounding_box": bounding_box}
+            for player_id, bounding_box in zip(
+                player_ids, track_table.bounding_box[rows]
+            )
+        }
+
+        teams = team_classifier.vote_player_teams(
+            video_frames[frame_num], player_detections, frame_num
+        )
+        track_table.team[rows] = [teams[player_id] for player_id in player_ids]
+
+
+def assign_ball_acquisition(track_table, min_hold_frames=1, use_kdtree=False):
+    player_assigner = PlayerBallAssigner(
+        min_hold_frames=min_hold_frames, use_kdtree=use_kdtree
+    )
+    assigned_rows = player_assigner.assign_ball_to_players(track_table)
+
+    is_assigned = assigned_rows >= 0
+    track_table.has_ball[assigned_rows[is_assigned]] = True
+
+    # Frames without an assigned player keep the team that last had the
+    # ball, and no team (0) before anyone had it
+    last_assigned = np.maximum.accumulate(
+        np.where(is_assigned, np.arange(track_table.num_frames), -1)
     )
+    last_rows = assigned_rows[np.maximum(last_assigned, 0)]
+
+    return np.where(last_assigned >= 0, track_table.team[last_rows], 0)
+
+
+def add_positions(
+    tracker,
+    camera_movement_estimator,
+    track_table,
+    camera_movement_per_frame,
+    profiler=None,
+):
+    num_frames = track_table.num_frames
+
+    # Interpolate ball positions, and all tracks over frames skipped by
+    # frame skipping
+    with profile_stage(profiler, "interpolation", items=num_frames):
+        track_table = tracker.interpolate_ball_track_table(track_table)
+        if tracker.detect_every > 1:
+            track_table = tracker.interpolate_track_table(track_table)
+
+    # Get object positions
+    with profile_stage(profiler, "positions", items=num_frames):
+        tracker.add_position_to_track_table(track_table)
+
+    # Camera Movement
+    with profile_stage(profiler, "camera_adjustment", items=num_frames):
+        camera_movement_estimator.add_adjust_positions_to_track_table(
+            track_table, camera_movement_per_frame
+        )
 
     # View Transformer
-    view_transformer = ViewTransformer()
-    view_transformer.add_transformed_position_to_tracks(tracks)
+    with profile_stage(profiler, "view_transform", items=num_frames):
+        view_transformer = ViewTransformer()
+        view_transformer.add_transformed_position_to_track_table(track_table)
 
-    # Interpolate ball positions
-    tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
+    # Speed and distance
+    with profile_stage(profiler, "speed_and_distance", items=num_frames):
+        speed_and_distance_estimator = SpeedAndDistanceEstimator()
+        speed_and_distance_estimator.add_speed_and_distance_to_track_table(track_table)
 
-    # Assign Player Teams
+    return track_table
+
+
+def draw_frame(
+    tracker,
+    camera_movement_estimator,
+    frame,
+    frame_num,
+    tracks,
+    possession_stats,
+    camera_movement_per_frame,
+):
+    # Single rendering stage, draws all annotations in place on `frame`
+    frame = tracker.draw_frame_annotations(frame, frame_num, tracks, possession_stats)
+    frame = SpeedAndDistanceEstimator().draw_frame_speed_and_distance(
+        frame, frame_num, tracks
+    )
+    return camera_movement_estimator.draw_frame_camera_movement(
+        frame, camera_movement_per_frame[frame_num]
+    )
+
+
+def get_stage_caches(
+    cache,
+    video_path,
+    tracker,
+    camera_movement_estimator,
+    parallel_camera_movement=False,
+):
+    # Cache entries are keyed by the video contents, the model and the
+    # parameters and code of each stage. Parallel camera movement is cached
+    # apart and by its chunking, it differs slightly from the sequential one.
+    if cache is None:
+        return None, None
+
+    video_hash = hash_file(video_path)
+    camera_cache = cache.stage(
+        "camera_movement",
+        video=video_hash,
+        parallel=PARALLEL_CAMERA_MOVEMENT if parallel_camera_movement else None,
+        **camera_movement_estimator.get_cache_key(),
+    )
+
+    # With frame skipping, tracks also depend on camera movement
+    uses_camera = tracker.motion_threshold is not None or tracker.detect_every > 1
+    tracks_cache = cache.stage(
+        "tracks",
+        video=video_hash,
+        camera=camera_cache.key if uses_camera else None,
+        **tracker.get_cache_key(),
+    )
+
+    return camera_cache, tracks_cache
+
+
+def run_streaming(
+    tracker,
+    video_path,
+    save_video_as,
+    team_voting=False,
+    executor=None,
+    cache=None,
+    profiler=None,
+    ball_min_hold_frames=1,
+    ball_use_kdtree=False,
+):
+    # Bounded-memory variant of main. The video is decoded twice: the first
+    # pass runs detection/tracking, camera movement and team assignment while
+    # holding only one detection batch of frames, the second pass re-decodes
+    # and streams annotated frames straight into the encoder. Ball
+    # interpolation and possession need the whole track history, so rendering
+    # cannot start before the first pass is done. With `team_voting`, team
+    # colors are learned from the first frame and then follow the video
+    # through incremental updates.
+    #
+    # With a StagedExecutor the stages overlap: decoding, camera movement
+    # and inference each get a thread, annotation runs on a worker pool and
+    # the calling thread encodes.
+    #
+    # Without `save_video_as` the second pass is skipped. Returns the track
+    # table and possession statistics.
+    #
+    # Stages of a pass run interleaved, so a StageProfiler times each pass
+    # as a whole plus the detection batches, tracking, team assignment and
+    # drawing inside it.
     team_classifier = TeamClassifier()
-    team_classifier.assign_team_color(video_frames[0], tracks["players"][0])
 
-    for frame_num, player_track in enumerate(tracks["players"]):
-        for player_id, track in player_track.items():
-            team = team_classifier.get_player_team(
-                video_frames[frame_num], track["bounding_box"], player_id
+    frames = iter_video(video_path)
+    if executor is not None:
+        frames = executor.source(frames)
+
+    first_frame = next(frames)
+    frames = itertools.chain([first_frame], frames)
+
+    # Camera movement runs ahead of detection so frame skipping can react
+    # to large camera motion
+    camera_movement_estimator = CameraMovementEstimator(first_frame)
+    camera_movement_per_frame = []
+
+    camera_cache, tracks_cache = get_stage_caches(
+        cache, video_path, tracker, camera_movement_estimator
+    )
+
+    def add_camera_movement(frames):
+        for frame, camera_movement in camera_movement_estimator.iter_camera_movement(
+            frames, camera_cache
+        ):
+            camera_movement_per_frame.append(camera_movement)
+            yield frame, camera_movement
+
+    frames = add_camera_movement(frames)
+    if executor is not None:
+        frames = executor.source(frames)
+
+    frames, camera_movements = itertools.tee(frames)
+    frames = (frame for frame, _ in frames)
+    camera_movements = (camera_movement for _, camera_movement in camera_movements)
+
+    if tracks_cache is not None:
+        tracked_frames = tracker.iter_cached_object_tracks(
+            frames, camera_movements, tracks_cache
+        )
+    else:
+        tracked_frames = tracker.iter_object_tracks(frames, camera_movements)
+    if executor is not None:
+        tracked_frames = executor.source(tracked_frames)
+
+    tracks = {"players": [], "referees": [], "ball": []}
+
+    with profile_stage(profiler, "analysis_pass") as analysis_pass:
+        for frame_num, (frame, frame_tracks) in enumerate(tracked_frames):
+            with profile_stage(profiler, "team_assignment", items=1):
+                if frame_num == 0:
+                    team_classifier.assign_team_color(frame, frame_tracks["players"], 0)
+
+                if team_voting:
+                    teams = team_classifier.vote_player_teams(
+                        frame, frame_tracks["players"], frame_num
+                    )
+                else:
+                    teams = team_classifier.get_player_teams(
+                        frame, frame_tracks["players"], frame_num
+                    )
+            for player_id, track in frame_tracks["players"].items():
+                track["team"] = teams[player_id]
+
+            for object, track in frame_tracks.items():
+                tracks[object].append(track)
+
+        analysis_pass["items"] = len(camera_movement_per_frame)
+
+    track_table = add_positions(
+        tracker,
+        camera_movement_estimator,
+        TrackTable.from_tracks(tracks),
+        camera_movement_per_frame,
+        profiler,
+    )
+
+    with profile_stage(profiler, "ball_assignment", items=track_table.num_frames):
+        team_ball_control = assign_ball_acquisition(
+            track_table, ball_min_hold_frames, ball_use_kdtree
+        )
+        possession_stats = PossessionStats(team_ball_control)
+
+    if save_video_as is None:
+        return track_table, possession_stats
+
+    tracks = track_table.to_tracks(team_classifier.team_colors)
+
+    def draw_numbered_frame(numbered_frame):
+        frame_num, frame = numbered_frame
+        with profile_stage(profiler, "draw", items=1):
+            return draw_frame(
+                tracker,
+                camera_movement_estimator,
+                frame,
+                frame_num,
+                tracks,
+                possession_stats,
+                camera_movement_per_frame,
             )
-            tracks["players"][frame_num][player_id]["team"] = team
-            tracks["players"][frame_num][player_id]["team_color"] = (
-                team_classifier.team_colors[team]
+
+    frames = enumerate(iter_video(video_path))
+    if executor is not None:
+        output_video_frames = executor.map(draw_numbered_frame, executor.source(frames))
+    else:
+        output_video_frames = map(draw_numbered_frame, frames)
+
+    with profile_stage(profiler, "render_pass", items=track_table.num_frames):
+        save_video(output_video_frames, str(save_video_as))
+
+    return track_table, possession_stats
+
+
+def main(
+    model_name: str = "best.pt",
+    video_path: str = config.SAMPLE_VID,
+    streaming: bool = False,
+    team_voting: bool = False,
+    pipelined: bool = False,
+    num_workers: int = 4,
+    queue_size: int = 16,
+    batch_size: int | str = 20,
+    conf: float = 0.1,
+    imgsz: int | None = None,
+    detect_every: int = 1,
+    motion_threshold: float | None = None,
+    use_cache: bool = True,
+    cache_size_mb: float = 10240,
+    cache_chunk_size: int = 500,
+    parallel_camera_movement: bool = False,
+    parallel_tracking: bool = False,
+    lazy_frames: bool = False,
+    ball_min_hold_frames: int = 1,
+    ball_use_kdtree: bool = False,
+    headless: bool = False,
+    export_formats: tuple[str, ...] = ("csv", "json"),
+    cprofile_stages: tuple[str, ...] | str = (),
+    save_dir: str | Path | None = None,
+    tracker: Tracker | None = None,
+):
+    # Streaming decodes the video itself and tracks it in one pass
+    if streaming or pipelined:
+        options = {
+            "parallel_camera_movement": parallel_camera_movement,
+            "parallel_tracking": parallel_tracking,
+            "lazy_frames": lazy_frames,
+        }
+        unsupported = [name for name, enabled in options.items() if enabled]
+        if unsupported:
+            raise ValueError(
+                f"Not supported in streaming mode: {', '.join(unsupported)}"
             )
 
-    # Assign Ball Acquisition
-    player_assigner = PlayerBallAssigner()
-    team_ball_control = []
-    for frame_num, player_track in enumerate(tracks["players"]):
-        ball_bounding_box = tracks["ball"][frame_num][1]["bounding_box"]
-        assigned_player = player_assigner.assign_ball_to_player(
-            player_track, ball_bounding_box
+    # Reports go to reports/<timestamp> unless `save_dir` is given
+    if save_dir is None:
+        report_name = datetime.now().strftime("%Y%m%d_%H%M%S")
+        save_dir = Path(config.REPORTS_DIR, report_name)
+
+    save_dir = Path(save_dir)
+    save_dir.mkdir(parents=True, exist_ok=True)
+
+    # Per-stage timings go to profile.json in the report directory, stages
+    # in `cprofile_stages` ("all" for every stage) also get a .prof file
+    profiler = StageProfiler(cprofile_stages, profile_dir=save_dir)
+    profile_path = Path(save_dir, "profile.json")
+
+    # Initialize Tracker. A Tracker passed in keeps its loaded model and
+    # settings and only starts tracking anew.
+    if tracker is None:
+        model_path = Path(config.MODELS_DIR, model_name)
+        tracker = Tracker(
+            model_path,
+            batch_size=batch_size,
+            conf=conf,
+            imgsz=imgsz,
+            detect_every=detect_every,
+            motion_threshold=motion_threshold,
+            profiler=profiler,
+        )
+    else:
+        tracker.reset()
+        tracker.profiler = profiler
+
+    video_name = "output"
+    video_format = "avi"
+    save_video_as = Path(save_dir, f"{video_name}.{video_format}")
+
+    # Headless mode only writes structured analytics, nothing is rendered
+    # or encoded
+    analytics_exporter = None
+    if headless:
+        analytics_exporter = AnalyticsExporter(save_dir, export_formats)
+        save_video_as = None
+
+    # Detections, tracks and camera movement are cached per video, model
+    # and parameters
+    cache = None
+    if use_cache:
+        cache = StageCache(
+            Path(config.STUB_DIR, "cache"),
+            max_size_mb=cache_size_mb,
+            chunk_size=cache_chunk_size,
+        )
+
+    # Pipelined mode is streaming with every stage on its own thread
+    if streaming or pipelined:
+        executor = None
+        if pipelined:
+            executor = StagedExecutor(queue_size=queue_size, num_workers=num_workers)
+
+        track_table, possession_stats = run_streaming(
+            tracker,
+            video_path,
+            save_video_as,
+            team_voting,
+            executor,
+            cache,
+            profiler,
+            ball_min_hold_frames,
+            ball_use_kdtree,
         )
+        if analytics_exporter is not None:
+            with profile_stage(profiler, "export"):
+                analytics_exporter.export(track_table, possession_stats)
 
-        if assigned_player != -1:
-            tracks["players"][frame_num][assigned_player]["has_ball"] = True
-            team_ball_control.append(
-                tracks["players"][frame_num][assigned_player]["team"]
+        profiler.save(profile_path)
+        return
+
+    # Read Video. Lazy frames are decoded on access instead: every full
+    # pass decodes the video again, and team assignment only decodes the
+    # frames it looks at. Voting looks at every frame in order.
+    with profile_stage(profiler, "read_video") as stage:
+        if lazy_frames:
+            video_frames = VideoSource(video_path, prefetch=8 if team_voting else 0)
+        else:
+            video_frames = read_video(video_path)
+        stage["items"] = len(video_frames)
+    num_frames = len(video_frames)
+
+    # Camera Movement Estimator
+    camera_movement_estimator = CameraMovementEstimator(video_frames[0])
+    camera_cache, tracks_cache = get_stage_caches(
+        cache, video_path, tracker, camera_movement_estimator, parallel_camera_movement
+    )
+    with profile_stage(profiler, "camera_movement", items=num_frames):
+        if parallel_camera_movement:
+            camera_movement_per_frame = (
+                camera_movement_estimator.get_camera_movement_parallel(
+                    video_path,
+                    num_workers,
+                    cache=camera_cache,
+                    **PARALLEL_CAMERA_MOVEMENT,
+                )
             )
         else:
-            team_ball_control.append(team_ball_control[-1])
+            camera_movement_per_frame = camera_movement_estimator.get_camera_movement(
+                video_frames, cache=camera_cache
+            )
 
-    team_ball_control = np.array(team_ball_control)
+    # Team assignment only needs a jersey crop of every track, gathered
+    # while the frames are tracked. Voting looks at every frame instead.
+    team_crops = None if team_voting else TeamCropBuffer()
 
-    # Draw output
-    ## Draw object tracks
-    output_video_frames = tracker.draw_annotations(
-        video_frames, tracks, team_ball_control
+    # Detect and track objects, detection batches and tracking are also
+    # timed on their own unless they run in worker processes
+    with profile_stage(profiler, "object_tracks", items=num_frames):
+        if parallel_tracking:
+            tracks = tracker.get_object_tracks_parallel(
+                video_path, num_workers, camera_movements=camera_movement_per_frame
+            )
+            track_table = TrackTable.from_tracks(tracks)
+        else:
+            track_table = tracker.get_object_track_table(
+                video_frames,
+                camera_movements=camera_movement_per_frame,
+                cache=tracks_cache,
+                team_crops=team_crops,
+            )
+
+    # Ball interpolation, positions, camera adjustment and view transform
+    track_table = add_positions(
+        tracker,
+        camera_movement_estimator,
+        track_table,
+        camera_movement_per_frame,
+        profiler,
     )
 
-    ## Draw camera movement
-    output_video_frames = camera_movement_estimator.draw_camera_movement(
-        output_video_frames, camera_movement_per_frame
+    # Assign Player Teams
+    with profile_stage(profiler, "team_assignment", items=num_frames):
+        team_classifier = TeamClassifier()
+        if team_voting:
+            assign_player_teams_voting(team_classifier, video_frames, track_table)
+        elif team_crops.num_frames:
+            team_classifier.assign_teams_from_crops(team_crops)
+            add_teams_to_track_table(team_classifier, track_table)
+        else:
+            # Tracked in other processes, frames are looked up again
+            assign_player_teams(team_classifier, video_frames, track_table)
+
+    if lazy_frames:
+        video_frames.close()
+
+    # Assign Ball Acquisition
+    # A different player only takes the ball after being the closest for
+    # `ball_min_hold_frames` frames in a row
+    with profile_stage(profiler, "ball_assignment", items=num_frames):
+        team_ball_control = assign_ball_acquisition(
+            track_table, ball_min_hold_frames, ball_use_kdtree
+        )
+        possession_stats = PossessionStats(team_ball_control)
+
+    if analytics_exporter is not None:
+        with profile_stage(profiler, "export"):
+            analytics_exporter.export(track_table, possession_stats)
+
+        profiler.save(profile_path)
+        return
+
+    tracks = track_table.to_tracks(team_classifier.team_colors)
+
+    # Draw output in place, one frame at a time straight into the encoder.
+    # The decoded frames are not needed afterwards.
+    # Drawing is timed per frame, the rest of render_and_save is encoding
+    draw = profiler.wrap("draw", draw_frame)
+    output_video_frames = (
+        draw(
+            tracker,
+            camera_movement_estimator,
+            frame,
+            frame_num,
+            tracks,
+            possession_stats,
+            camera_movement_per_frame,
+        )
+        for frame_num, frame in enumerate(video_frames)
     )
 
     # Save Video
-    video_name = "output"
-    video_format = "avi"
-    save_video_as = Path(save_dir, f"{video_name}.{video_format}")
+    with profile_stage(profiler, "render_and_save", items=num_frames):
+        save_video(output_video_frames, str(save_video_as))
 
-    save_video(output_video_frames, str(save_video_as))
+    profiler.save(profile_path)
 
 
-if __name__ == "__main__":
+def cli():
+    parser = argparse.ArgumentParser(description="Football analysis")
+    parser.add_argument("--model-name", default="best.pt")
+    parser.add_argument("--video-path", default=config.SAMPLE_VID)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--pipelined", action="store_true")
+    parser.add_argument("--team-voting", action="store_true")
+    parser.add_argument("--num-workers", type=int, default=4)
+    parser.add_argument("--batch-size", default="20")
+    parser.add_argument("--detect-every", type=int, default=1)
+    parser.add_argument("--motion-threshold", type=float, default=None)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--lazy-frames",
+        action="store_true",
+        help="Decode frames on access instead of reading the whole video",
+    )
+    parser.add_argument(
+        "--parallel-camera-movement",
+        action="store_true",
+        help="Estimate camera movement of video chunks in --num-workers processes",
+    )
+    parser.add_argument(
+        "--parallel-tracking",
+        action="store_true",
+        help="Track time segments of the video in --num-workers processes",
+    )
+    parser.add_argument(
+        "--ball-min-hold-frames",
+        type=int,
+        default=1,
+        help="Frames a player must be closest to the ball before taking it",
+    )
+    parser.add_argument(
+        "--ball-use-kdtree",
+        action="store_true",
+        help="Find the player closest to the ball with a k-d tree",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Only write analytics, skip rendering and video encoding",
+    )
+    parser.add_argument(
+        "--export-formats", nargs="+", choices=FORMATS, default=["csv", "json"]
+    )
+    parser.add_argument(
+        "--cprofile-stages",
+        nargs="+",
+        default=[],
+        help='Stages to run under cProfile, or "all"',
+    )
+    args = parser.parse_args()
+
     setup_logging(level=logging.DEBUG)
-    main()
+    main(
+        model_name=args.model_name,
+        video_path=args.video_path,
+        streaming=args.streaming,
+        team_voting=args.team_voting,
+        pipelined=args.pipelined,
+        num_workers=args.num_workers,
+        batch_size=(
+            args.batch_size if args.batch_size == "auto" else int(args.batch_size)
+        ),
+        detect_every=args.detect_every,
+        motion_threshold=args.motion_threshold,
+        use_cache=not args.no_cache,
+        parallel_camera_movement=args.parallel_camera_movement,
+        parallel_tracking=args.parallel_tracking,
+        lazy_frames=args.lazy_frames,
+        ball_min_hold_frames=args.ball_min_hold_frames,
+        ball_use_kdtree=args.ball_use_kdtree,
+        headless=args.headless,
+        export_formats=tuple(args.export_formats),
+        cprofile_stages=(
+            "all" if args.cprofile_stages == ["all"] else tuple(args.cprofile_stages)
+        ),
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,9 +1,29 @@
-from src.utils import get_center_of_bounding_box, measure_distance
+import numpy as np
+
+from src.utils import (
+    get_center_of_bounding_box,
+    get_centers_of_bounding_boxes,
+    measure_distance,
+)
 
 
 class PlayerBallAssigner:
-    def __init__(self) -> None:
-        self.max_player_ball_distance = 70
+    def __init__(
+        self,
+        max_player_ball_distance: float = 70,
+        min_hold_frames: int = 1,
+        use_kdtree: bool = False,
+    ) -> None:
+        self.max_player_ball_distance = max_player_ball_distance
+
+        # Hysteresis for assign_ball_to_players: a different player only
+        # takes the ball once they are the closest for `min_hold_frames`
+        # frames in a row
+        self.min_hold_frames = min_hold_frames
+
+        # Nearest foot lookup through a k-d tree instead of all
+        # player-ball distances, for crowded frames
+        self.use_kdtree = use_kdtree
 
     def assign_ball_to_player(self, players, ball_bounding_box):
         ball_position = get_center_of_bounding_box(ball_bounding_box)
@@ -32,3 +52,114 @@ class PlayerBallAssigner:
                     assigned_player = player_id
 
         return assigned_player
+
+    def get_closest_player_rows(self, track_table):
+        # Row of the player closest to the ball in every frame, -1 where no
+        # player is within max_player_ball_distance, for all frames at once
+        closest_rows = np.full(track_table.num_frames, -1, dtype=np.int64)
+
+        ball_rows = track_table.object_rows("ball")
+        player_rows = track_table.object_rows("players")
+        if len(ball_rows) == 0 or len(player_rows) == 0:
+            return closest_rows
+
+        # One ball per frame
+        ball_frames, first_ball = np.unique(
+            track_table.frame[ball_rows], return_index=True
+        )
+        ball_positions = np.full((track_table.num_frames, 2), np.nan)
+        ball_positions[ball_frames] = get_centers_of_bounding_boxes(
+            track_table.bounding_box[ball_rows[first_ball]]
+        )
+
+        # Left and right foot of every player
+        bounding_boxes = track_table.bounding_box[player_rows].astype(np.float64)
+        player_frames = track_table.frame[player_rows]
+        feet = np.stack(
+            [bounding_boxes[:, [0, 3]], bounding_boxes[:, [2, 3]]], axis=1
+        )  # (N, 2 feet, 2)
+
+        if self.use_kdtree:
+            from scipy.spatial import cKDTree
+
+            # Frames are spread far apart along a third axis, so the nearest
+            # foot of a ball is always in the ball's frame
+            frame_spacing = 10 * self.max_player_ball_distance
+            points = np.concatenate(
+                [
+                    np.repeat(player_frames, 2)[:, None] * frame_spacing,
+                    feet.reshape(-1, 2),
+                ],
+                axis=1,
+            )
+            queries = np.concatenate(
+                [ball_frames[:, None] * frame_spacing, ball_positions[ball_frames]],
+                axis=1,
+            )
+
+            distances, indices = cKDTree(points).query(
+                queries, distance_upper_bound=self.max_player_ball_distance
+            )
+            found = distances < self.max_player_ball_distance
+            closest_rows[ball_frames[found]] = player_rows[indices[found] // 2]
+
+            return closest_rows
+
+        distances = np.sqrt(
+            np.square(feet - ball_positions[player_frames][:, None, :]).sum(axis=2)
+        ).min(axis=1)
+
+        # First row with the smallest distance in every frame, ties go to
+        # the lowest track id like assign_ball_to_player
+        in_range = np.flatnonzero(distances < self.max_player_ball_distance)
+        order = in_range[np.lexsort((distances[in_range], player_frames[in_range]))]
+        frames, first = np.unique(player_frames[order], return_index=True)
+        closest_rows[frames] = player_rows[order[first]]
+
+        return closest_rows
+
+    def assign_ball_to_players(self, track_table):
+        # Batched assign_ball_to_player over a TrackTable. Returns the row of
+        # the player with the ball in every frame, -1 for none.
+        closest_rows = self.get_closest_player_rows(track_table)
+
+        if self.min_hold_frames <= 1:
+            return closest_rows
+
+        track_ids = np.where(
+            closest_rows >= 0, track_table.track_id[closest_rows], -1
+        ).tolist()
+
+        assigned_rows = np.full(track_table.num_frames, -1, dtype=np.int64)
+        owner, candidate, candidate_frames = -1, -1, 0
+
+        for frame_num, track_id in enumerate(track_ids):
+            # A frame with nobody near the ball breaks the streak
+            if track_id == -1:
+                candidate, candidate_frames = -1, 0
+                continue
+
+            if track_id == owner:
+                candidate, candidate_frames = -1, 0
+            else:
+                if track_id == candidate:
+                    candidate_frames += 1
+                else:
+                    candidate, candidate_frames = track_id, 1
+
+                if owner == -1 or candidate_frames >= self.min_hold_frames:
+                    owner, candidate, candidate_frames = track_id, -1, 0
+
+            if owner == track_id:
+                assigned_rows[frame_num] = closest_rows[frame_num]
+                continue
+
+            # The current owner keeps the ball if they are in the frame
+            player_rows = track_table.frame_rows(frame_num, "players")
+            row = player_rows.start + np.searchsorted(
+                track_table.track_id[player_rows], owner
+            )
+            if row < player_rows.stop and track_table.track_id[row] == owner:
+                assigned_rows[frame_num] = row
+
+        return assigned_rows
@@ -0,0 +1 @@
+from .possession_stats import PossessionStats
@@ -0,0 +1,64 @@
+import numpy as np
+
+TEAM_IDS = (1, 2)
+
+
+class PossessionStats:
+    # Ball possession statistics from the per-frame team in control of the
+    # ball (0 for none). Cumulative per-team frame counts are computed once,
+    # so every per-frame statistic is a lookup.
+    def __init__(self, team_ball_control, fps: float = 24) -> None:
+        self.team_ball_control = np.asarray(team_ball_control).reshape(-1)
+        self.fps = fps
+
+        # (num_frames, 2) frames each team had the ball up to and including
+        # every frame
+        self.team_frames = np.cumsum(
+            self.team_ball_control[:, None] == np.array(TEAM_IDS)[None, :], axis=0
+        )
+
+    def __len__(self):
+        return len(self.team_ball_control)
+
+    @staticmethod
+    def _percentages(team_frames):
+        # Frames where neither team had the ball yet are 0% for both
+        total = team_frames.sum(axis=-1, keepdims=True)
+        return np.divide(
+            100 * team_frames,
+            total,
+            out=np.zeros(team_frames.shape, dtype=np.float64),
+            where=total > 0,
+        )
+
+    def possession(self):
+        # (num_frames, 2) possession percentage of team 1 and team 2 from the
+        # start of the video up to every frame
+        return self._percentages(self.team_frames)
+
+    def frame_possession(self, frame_num):
+        return self._percentages(self.team_frames[frame_num])
+
+    def rolling_possession(self, window: int):
+        # (num_frames, 2) possession percentages over the last `window` frames
+        if window < 1:
+            raise ValueError(f"Rolling window must be at least 1 frame: {window}")
+
+        team_frames = self.team_frames.copy()
+        team_frames[window:] -= self.team_frames[:-window]
+
+        return self._percentages(team_frames)
+
+    def player_possession(self, track_table):
+        # Player ids and the seconds each of them had the ball, as arrays
+        # sorted by player id
+        player_rows = track_table.object_rows("players")
+        player_ids = track_table.track_id[player_rows]
+        has_ball = track_table.has_ball[player_rows]
+
+        unique_player_ids, player_index = np.unique(player_ids, return_inverse=True)
+        possession_frames = np.bincount(
+            player_index[has_ball], minlength=len(unique_player_ids)
+        )
+
+        return unique_player_ids, possession_frames / self.fps
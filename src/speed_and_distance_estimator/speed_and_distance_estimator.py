@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+
+from src.utils import get_foot_position
+from src.trackers.track_table import OBJECT_IDS
+
+
+class SpeedAndDistanceEstimator:
+    def __init__(self, frame_window: int = 5, frame_rate: float = 24) -> None:
+        # Smoothed speed is the distance covered over the last
+        # `frame_window` rows of a track divided by the time it took
+        self.frame_window = frame_window
+        self.frame_rate = frame_rate
+
+    def add_speed_and_distance_to_track_table(self, track_table):
+        # Speed (km/h) and cumulative distance (m) of every player and
+        # referee row from position_transformed, for all tracks at once.
+        # Rows without a transformed position add no distance.
+        order, track_starts = track_table.track_order()
+
+        positions = track_table.position_transformed[order].astype(np.float64)
+        seconds = track_table.frame[order] / self.frame_rate
+        index = np.arange(len(order))
+
+        # Step from the previous row of the same track
+        previous = np.maximum(index - 1, track_starts)
+        steps = np.hypot(*(positions - positions[previous]).T)
+        steps[previous == index] = np.nan
+
+        cumulative_distance = np.cumsum(np.nan_to_num(steps))
+        distance = cumulative_distance - cumulative_distance[track_starts]
+
+        # Average speed over the window, from the cumulative distance
+        window_start = np.maximum(index - self.frame_window, track_starts)
+
+        # First rows of tracks divide by zero time and are set to NaN
+        with np.errstate(invalid="ignore", divide="ignore"):
+            speed = steps / (seconds - seconds[previous]) * 3.6
+            speed_smoothed = (
+                (distance - distance[window_start])
+                / (seconds - seconds[window_start])
+                * 3.6
+            )
+        speed_smoothed[window_start == index] = np.nan
+
+        has_position = ~np.isnan(positions[:, 0])
+        distance[~has_position] = np.nan
+        speed_smoothed[~has_position] = np.nan
+
+        is_person = track_table.object_id[order] != OBJECT_IDS["ball"]
+        rows = order[is_person]
+
+        track_table.speed[rows] = speed[is_person]
+        track_table.speed_smoothed[rows] = speed_smoothed[is_person]
+        track_table.distance[rows] = distance[is_person]
+
+    def draw_frame_speed_and_distance(self, frame, frame_num, tracks):
+        # Draws in place on `frame`, below every player
+        for track_info in tracks["players"][frame_num].values():
+            speed = track_info.get("speed_smoothed")
+            distance = track_info.get("distance")
+
+            if speed is None or distance is None:
+                continue
+
+            x, y = get_foot_position(track_info["bounding_box"])
+            position = (x, y + 40)
+
+            cv2.putText(
+                frame,
+                f"{speed:.2f} km/h",
+                position,
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 0, 0),
+                2,
+            )
+            cv2.putText(
+                frame,
+                f"{distance:.2f} m",
+                (position[0], position[1] + 20),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 0, 0),
+                2,
+            )
+
+        return frame
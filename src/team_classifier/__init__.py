@@ -1 +1 @@
-from .team_classifier import TeamClassifier
+from .team_classifier import TeamClassifier, TeamCropBuffer
@@ -1,12 +1,147 @@
-from sklearn.cluster import KMeans
+from collections import OrderedDict, deque
 
+import numpy as np
 
-class TeamClassifier:
+# Teams fixed by track id regardless of jersey color, kept from the
+# original sample video analysis
+TEAM_OVERRIDES = {82: 1}
+
+
+def get_player_crop(frame, bounding_box):
+    x1, y1, x2, y2 = tuple(map(lambda x: int(x), bounding_box))
+    image = frame[y1:y2, x1:x2]
+
+    return image[0 : int(image.shape[0] / 2), :]
+
+
+def get_crop_colors(crops, max_iter=10):
+    # Batched 2-cluster Lloyd's iteration over many crops at once. Crops are
+    # padded to the largest one and padded pixels are masked out. Returns the
+    # (N, 3) player color of every crop, picked like get_player_color does:
+    # the cluster not covering most of the corners.
+    num_crops = len(crops)
+    sizes = [crop.shape[0] * crop.shape[1] for crop in crops]
+    max_size = max(sizes + [1])
+
+    pixels = np.zeros((num_crops, max_size, 3), dtype=np.float32)
+    valid = np.zeros((num_crops, max_size), dtype=bool)
+    corners = np.zeros((num_crops, 4), dtype=np.int64)
+    middles = np.zeros(num_crops, dtype=np.int64)
+
+    for i, crop in enumerate(crops):
+        height, width = crop.shape[:2]
+        pixels[i, : sizes[i]] = crop.reshape(-1, 3)
+        valid[i, : sizes[i]] = True
+        if sizes[i]:
+            corners[i] = [0, width - 1, (height - 1) * width, sizes[i] - 1]
+            middles[i] = (height // 2) * width + width // 2
+
+    crop_idx = np.arange(num_crops)
+
+    # Start the background cluster at the mean corner pixel and the player
+    # cluster at the center pixel, where the jersey usually is
+    centers = np.empty((num_crops, 2, 3), dtype=np.float32)
+    centers[:, 0] = pixels[crop_idx[:, None], corners].mean(axis=1)
+    centers[:, 1] = pixels[crop_idx, middles]
+
+    def assign_labels(centers):
+        # Nearest of two centers is a half-space test, one dot product per pixel
+        direction = centers[:, 1] - centers[:, 0]
+        threshold = (
+            np.square(centers[:, 1]).sum(axis=1) - np.square(centers[:, 0]).sum(axis=1)
+        ) / 2
+        return np.einsum("npc,nc->np", pixels, direction) > threshold[:, None]
+
+    for _ in range(max_iter):
+        labels = assign_labels(centers)
+
+        new_centers = centers.copy()
+        for k, members in enumerate((~labels & valid, labels & valid)):
+            counts = members.sum(axis=1)
+            sums = np.einsum("np,npc->nc", members.astype(np.float32), pixels)
+            has_members = counts > 0
+            new_centers[has_members, k] = sums[has_members] / counts[has_members, None]
+
+        converged = np.allclose(new_centers, centers)
+        centers = new_centers
+        if converged:
+            break
+
+    labels = assign_labels(centers).astype(np.int64)
+
+    # Ties go to cluster 0, same as get_player_color
+    corner_labels = labels[crop_idx[:, None], corners]
+    non_player_cluster = (corner_labels.sum(axis=1) > 2).astype(np.int64)
+    player_cluster = 1 - non_player_cluster
+
+    return centers[crop_idx, player_cluster].astype(np.float64)
+
+
+class TeamCropBuffer:
+    # Jersey crops team assignment needs, gathered while frames stream by:
+    # every player of the first frame to learn the team colors, and every
+    # track the first time it is seen. Crops are copied out of the frames,
+    # so no frame has to be kept for TeamClassifier.assign_teams_from_crops.
     def __init__(self) -> None:
+        self.num_frames = 0
+        self.color_crops = []
+        self.player_ids = []
+        self.player_crops = []
+        self.seen_player_ids = set()
+
+    def __len__(self):
+        return len(self.player_crops)
+
+    def add_frame(self, frame, player_detections):
+        crops = {
+            player_id: get_player_crop(frame, player_detection["bounding_box"])
+            for player_id, player_detection in player_detections.items()
+            if self.num_frames == 0 or player_id not in self.seen_player_ids
+        }
+
+        if self.num_frames == 0:
+            self.color_crops = [crop.copy() for crop in crops.values()]
+
+        for player_id, crop in crops.items():
+            if player_id not in self.seen_player_ids:
+                self.seen_player_ids.add(player_id)
+                self.player_ids.append(player_id)
+                self.player_crops.append(crop.copy())
+
+        self.num_frames += 1
+
+
+class TeamClassifier:
+    def __init__(
+        self,
+        color_method: str = "lloyd",
+        vote_window: int = 25,
+        vote_every: int = 5,
+        learning_rate: float = 0.05,
+        color_cache_size: int = 10000,
+    ) -> None:
+        # "lloyd" uses the batched NumPy engine, "kmeans" fits sklearn's
+        # KMeans on every crop
+        self.color_method = color_method
+
+        # Voting mode (vote_player_teams): every track keeps its last
+        # `vote_window` predictions, players are re-classified every
+        # `vote_every` frames and team colors drift towards new samples by
+        # `learning_rate`
+        self.vote_window = vote_window
+        self.vote_every = vote_every
+        self.learning_rate = learning_rate
+
         self.team_colors = {}
         self.player_team_dict = {}
+        self.player_votes = {}
+
+        self.color_cache_size = color_cache_size
+        self.player_color_cache = OrderedDict()
 
     def get_clustering_model(self, image):
+        from sklearn.cluster import KMeans
+
         # Reshape the image to 2D array
         image_2d = image.reshape(-1, 3)
 
@@ -17,10 +152,11 @@ class TeamClassifier:
         return kmeans
 
     def get_player_color(self, frame, bounding_box):
-        x1, y1, x2, y2 = tuple(map(lambda x: int(x), bounding_box))
-        image = frame[y1:y2, x1:x2]
+        return self.get_crop_color(get_player_crop(frame, bounding_box))
 
-        top_half_image = image[0 : int(image.shape[0] / 2), :]
+    def get_crop_color(self, top_half_image):
+        if self.color_method != "kmeans":
+            return get_crop_colors([top_half_image])[0]
 
         # Clustering model
         kmeans = self.get_clustering_model(top_half_image)
@@ -47,14 +183,51 @@ class TeamClassifier:
 
         return player_color
 
-    def assign_team_color(self, frame, player_detections):
-        player_colors = []
+    def get_crops_colors(self, crops, batch_size=None):
+        # Player colors of many crops, in batches of `batch_size` crops as
+        # the Lloyd engine pads every crop of a batch to the largest one
+        if self.color_method == "kmeans":
+            return [self.get_crop_color(crop) for crop in crops]
+
+        batch_size = batch_size or max(len(crops), 1)
+
+        return [
+            color
+            for start in range(0, len(crops), batch_size)
+            for color in get_crop_colors(crops[start : start + batch_size])
+        ]
+
+    def get_player_colors(self, frame, player_detections, frame_num=None):
+        # Colors of every player in one frame, extracted in a single batch.
+        # With `frame_num` set, colors are cached per (frame_num, track_id).
+        player_colors = {}
+        missing = []
+
+        for player_id, player_detection in player_detections.items():
+            if (frame_num, player_id) in self.player_color_cache:
+                player_colors[player_id] = self.player_color_cache[
+                    (frame_num, player_id)
+                ]
+            else:
+                missing.append((player_id, player_detection["bounding_box"]))
+
+        if missing:
+            colors = self.get_crops_colors(
+                [get_player_crop(frame, bounding_box) for _, bounding_box in missing]
+            )
 
-        for _, player_detection in player_detections.items():
-            bounding_box = player_detection["bounding_box"]
+            for (player_id, _), color in zip(missing, colors):
+                player_colors[player_id] = color
+                if frame_num is not None:
+                    self.player_color_cache[(frame_num, player_id)] = color
 
-            player_color = self.get_player_color(frame, bounding_box)
-            player_colors.append(player_color)
+            while len(self.player_color_cache) > self.color_cache_size:
+                self.player_color_cache.popitem(last=False)
+
+        return player_colors
+
+    def fit_team_colors(self, player_colors):
+        from sklearn.cluster import KMeans
 
         kmeans = KMeans(n_clusters=2, random_state=0, init="k-means++", n_init=10)
         kmeans.fit(player_colors)
@@ -64,6 +237,80 @@ class TeamClassifier:
         self.team_colors[1] = kmeans.cluster_centers_[0]
         self.team_colors[2] = kmeans.cluster_centers_[1]
 
+    def assign_team_color(self, frame, player_detections, frame_num=None):
+        player_colors = list(
+            self.get_player_colors(frame, player_detections, frame_num).values()
+        )
+
+        self.fit_team_colors(player_colors)
+
+    def assign_team_color_from_frames(self, frames, player_detections, frame_nums):
+        # Same as assign_team_color, but learns team colors from players
+        # sampled over several frames
+        player_colors = []
+
+        for frame, frame_player_detections, frame_num in zip(
+            frames, player_detections, frame_nums
+        ):
+            player_colors += list(
+                self.get_player_colors(
+                    frame, frame_player_detections, frame_num
+                ).values()
+            )
+
+        self.fit_team_colors(player_colors)
+
+    def assign_teams_from_crops(self, team_crops, batch_size=256):
+        # assign_team_color and get_player_teams over a TeamCropBuffer,
+        # every track classified from the crop of its first frame in
+        # batches, without any frame
+        self.fit_team_colors(self.get_crops_colors(team_crops.color_crops))
+
+        if not len(team_crops):
+            return self.player_team_dict
+
+        player_colors = self.get_crops_colors(team_crops.player_crops, batch_size)
+        team_ids = self.kmeans.predict(np.array(player_colors))
+
+        for player_id, team_id in zip(team_crops.player_ids, team_ids.tolist()):
+            if player_id in self.player_team_dict:
+                continue
+
+            self.set_player_team(player_id, team_id)
+
+        return self.player_team_dict
+
+    def predict_teams(self, player_colors):
+        # Nearest team color, this follows the incremental updates while
+        # self.kmeans stays at the initial fit
+        team_colors = np.array([self.team_colors[1], self.team_colors[2]])
+        distances = np.square(
+            np.asarray(player_colors)[:, None, :] - team_colors[None, :, :]
+        ).sum(axis=2)
+
+        return distances.argmin(axis=1) + 1
+
+    def update_team_colors(self, player_colors, teams):
+        # Mini-batch update: move each team color towards the mean color of
+        # the players just assigned to it. Team ids never swap.
+        player_colors = np.asarray(player_colors)
+
+        for team_id in (1, 2):
+            members = player_colors[teams == team_id]
+
+            if len(members):
+                team_color = self.team_colors[team_id]
+                self.team_colors[team_id] = team_color + self.learning_rate * (
+                    members.mean(axis=0) - team_color
+                )
+
+    def set_player_team(self, player_id, label):
+        # Team (1 or 2) of a new player from its KMeans label
+        team_id = TEAM_OVERRIDES.get(player_id, label + 1)
+        self.player_team_dict[player_id] = team_id
+
+        return team_id
+
     def get_player_team(self, frame, player_bounding_box, player_id):
         if player_id in self.player_team_dict:
             return self.player_team_dict[player_id]
@@ -71,11 +318,64 @@ class TeamClassifier:
         player_color = self.get_player_color(frame, player_bounding_box)
 
         team_id = self.kmeans.predict(player_color.reshape(1, -1))[0]
-        team_id += 1
 
-        if player_id == 82:
-            team_id = 1
+        return self.set_player_team(player_id, team_id)
 
-        self.player_team_dict[player_id] = team_id
+    def get_player_teams(self, frame, player_detections, frame_num=None):
+        # Batched get_player_team for every player in one frame
+        new_players = {
+            player_id: player_detection
+            for player_id, player_detection in player_detections.items()
+            if player_id not in self.player_team_dict
+        }
 
-        return team_id
+        if new_players:
+            player_colors = self.get_player_colors(frame, new_players, frame_num)
+            team_ids = self.kmeans.predict(np.array(list(player_colors.values())))
+
+            for player_id, team_id in zip(player_colors, team_ids.tolist()):
+                self.set_player_team(player_id, team_id)
+
+        return {
+            player_id: self.player_team_dict[player_id]
+            for player_id in player_detections
+        }
+
+    def get_voted_team(self, player_id):
+        votes = self.player_votes[player_id]
+
+        team_1_votes = votes.count(1)
+        team_2_votes = len(votes) - team_1_votes
+
+        # Ties go to the most recent vote
+        if team_1_votes == team_2_votes:
+            return votes[-1]
+
+        return 1 if team_1_votes > team_2_votes else 2
+
+    def vote_player_teams(self, frame, player_detections, frame_num):
+        # Voting alternative to get_player_teams, call once per frame in
+        # order. New players are classified right away, known players every
+        # `vote_every` frames, and each classification also nudges the team
+        # colors so they follow lighting changes.
+        to_classify = {
+            player_id: player_detection
+            for player_id, player_detection in player_detections.items()
+            if player_id not in self.player_votes or frame_num % self.vote_every == 0
+        }
+
+        if to_classify:
+            player_colors = self.get_player_colors(frame, to_classify, frame_num)
+            colors = np.array(list(player_colors.values()))
+
+            teams = self.predict_teams(colors)
+            self.update_team_colors(colors, teams)
+
+            for player_id, team_id in zip(player_colors, teams.tolist()):
+                if player_id not in self.player_votes:
+                    self.player_votes[player_id] = deque(maxlen=self.vote_window)
+                self.player_votes[player_id].append(team_id)
+
+        return {
+            player_id: self.get_voted_team(player_id) for player_id in player_detections
+        }
@@ -1 +1,2 @@
 from .tracker import Tracker
+from .track_table import TrackTable
@@ -0,0 +1,401 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+OBJECT_NAMES = ("players", "referees", "ball")
+OBJECT_IDS = {name: object_id for object_id, name in enumerate(OBJECT_NAMES)}
+
+# Columns set from detections
+BASE_COLUMNS = ("frame", "track_id", "object_id", "bounding_box")
+
+# Per-row columns filled in by later stages and their fill values
+COLUMN_DEFAULTS = {
+    "position": (np.float32, (2,), np.nan),
+    "position_adjusted": (np.float32, (2,), np.nan),
+    "position_transformed": (np.float32, (2,), np.nan),
+    "team": (np.int8, (), 0),
+    "has_ball": (np.bool_, (), False),
+    "speed": (np.float32, (), np.nan),
+    "speed_smoothed": (np.float32, (), np.nan),
+    "distance": (np.float32, (), np.nan),
+}
+
+
+class TrackTable:
+    # Columnar store of every tracked detection in a video, one row per
+    # (frame, object, track_id), sorted by frame, then object, then track_id.
+    # Unset positions are NaN and an unassigned team is 0.
+    def __init__(
+        self, frame, track_id, object_id, bounding_box, num_frames=None, **columns
+    ):
+        frame = np.asarray(frame, dtype=np.int32).reshape(-1)
+        track_id = np.asarray(track_id, dtype=np.int32).reshape(-1)
+        object_id = np.asarray(object_id, dtype=np.int8).reshape(-1)
+        bounding_box = np.asarray(bounding_box, dtype=np.float32).reshape(-1, 4)
+
+        order = np.lexsort((track_id, object_id, frame))
+
+        self.frame = frame[order]
+        self.track_id = track_id[order]
+        self.object_id = object_id[order]
+        self.bounding_box = bounding_box[order]
+
+        num_rows = len(self.frame)
+
+        for name, (dtype, shape, fill_value) in COLUMN_DEFAULTS.items():
+            if columns.get(name) is None:
+                column = np.full((num_rows, *shape), fill_value, dtype=dtype)
+            else:
+                column = np.asarray(columns[name], dtype=dtype).reshape(
+                    num_rows, *shape
+                )[order]
+            setattr(self, name, column)
+
+        if num_frames is None:
+            num_frames = int(self.frame[-1]) + 1 if num_rows else 0
+        self.num_frames = num_frames
+
+        self.frame_offsets = np.searchsorted(self.frame, np.arange(self.num_frames + 1))
+        self._track_slices = None
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def nbytes(self):
+        return sum(
+            getattr(self, name).nbytes for name in BASE_COLUMNS + tuple(COLUMN_DEFAULTS)
+        )
+
+    def columns(self):
+        return {name: getattr(self, name) for name in COLUMN_DEFAULTS}
+
+    @classmethod
+    def _from_sorted(cls, num_frames, **columns):
+        # Wraps columns that are already in table order without copying them
+        table = cls.__new__(cls)
+
+        for name in BASE_COLUMNS:
+            setattr(table, name, columns[name])
+
+        num_rows = len(table.frame)
+
+        for name, (dtype, shape, fill_value) in COLUMN_DEFAULTS.items():
+            column = columns.get(name)
+            if column is None:
+                column = np.full((num_rows, *shape), fill_value, dtype=dtype)
+            setattr(table, name, column)
+
+        table.num_frames = num_frames
+        table.frame_offsets = np.searchsorted(table.frame, np.arange(num_frames + 1))
+        table._track_slices = None
+
+        return table
+
+    def save(self, path, extra_columns=None):
+        # Columnar on-disk format: a directory with one .npy file per column,
+        # the frame offsets and a small JSON header. Of the columns filled in
+        # by later stages only `extra_columns` are saved, all by default.
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        if extra_columns is None:
+            extra_columns = tuple(COLUMN_DEFAULTS)
+        column_names = BASE_COLUMNS + tuple(extra_columns)
+        for name in column_names:
+            np.save(Path(path, f"{name}.npy"), getattr(self, name))
+        np.save(Path(path, "frame_offsets.npy"), self.frame_offsets)
+
+        header = {
+            "format": "track_table",
+            "version": 1,
+            "num_frames": self.num_frames,
+            "columns": list(column_names),
+        }
+        with open(Path(path, "header.json"), "w") as f:
+            json.dump(header, f)
+
+    @classmethod
+    def load(cls, path, frames=None, object=None, mmap=True):
+        # Reads a table written by save. `frames` is a (start, stop) range,
+        # rows outside of it are never read and frame numbers are kept, so
+        # frames before `start` are empty. With `mmap`, columns are
+        # copy-on-write memory maps of the files.
+        path = Path(path)
+
+        with open(Path(path, "header.json")) as f:
+            header = json.load(f)
+
+        if header.get("format") != "track_table":
+            raise ValueError(f"Not a track table: {path}")
+
+        num_frames = header["num_frames"]
+        start, stop = (0, num_frames) if frames is None else frames
+        stop = min(stop, num_frames)
+
+        frame_offsets = np.load(Path(path, "frame_offsets.npy"))
+        rows = slice(int(frame_offsets[start]), int(frame_offsets[stop]))
+
+        mmap_mode = "c" if mmap else None
+        columns = {
+            name: np.load(Path(path, f"{name}.npy"), mmap_mode=mmap_mode)[rows]
+            for name in header["columns"]
+        }
+
+        if object is not None:
+            keep = columns["object_id"] == OBJECT_IDS[object]
+            columns = {name: column[keep] for name, column in columns.items()}
+
+        return cls._from_sorted(stop, **columns)
+
+    @classmethod
+    def concat(cls, tables):
+        # Joins tables of consecutive frame ranges, each numbered from 0. A
+        # single table is returned as it is.
+        if len(tables) == 1:
+            return tables[0]
+        if not tables:
+            return cls([], [], [], [])
+
+        offsets = np.cumsum([0] + [table.num_frames for table in tables[:-1]])
+        columns = {
+            name: np.concatenate([getattr(table, name) for table in tables])
+            for name in BASE_COLUMNS + tuple(COLUMN_DEFAULTS)
+        }
+        columns["frame"] = np.concatenate(
+            [table.frame + offset for table, offset in zip(tables, offsets.tolist())]
+        ).astype(np.int32)
+
+        return cls._from_sorted(sum(table.num_frames for table in tables), **columns)
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        # Build from the legacy {"players": [{track_id: {...}}, ...], ...} shape
+        num_frames = max(len(object_tracks) for object_tracks in tracks.values())
+
+        frame, track_id, object_id, bounding_box = [], [], [], []
+        columns = {name: [] for name in COLUMN_DEFAULTS}
+        defaults = {
+            name: np.full(shape, fill_value, dtype=dtype)
+            for name, (dtype, shape, fill_value) in COLUMN_DEFAULTS.items()
+        }
+
+        for object, object_tracks in tracks.items():
+            for frame_num, track in enumerate(object_tracks):
+                for current_track_id, track_info in track.items():
+                    frame.append(frame_num)
+                    track_id.append(current_track_id)
+                    object_id.append(OBJECT_IDS[object])
+                    bounding_box.append(track_info["bounding_box"])
+
+                    for name, default in defaults.items():
+                        value = track_info.get(name)
+                        columns[name].append(default if value is None else value)
+
+        return cls(frame, track_id, object_id, bounding_box, num_frames, **columns)
+
+    def _with_rows(self, keep, object, frame, track_id, bounding_box, **new_columns):
+        # New table with the rows selected by `keep` plus new rows of `object`.
+        # Computed columns of the kept rows are preserved, the new rows take
+        # `new_columns` or the defaults.
+        frame = np.asarray(frame, dtype=np.int32).reshape(-1)
+
+        num_new_rows = len(frame)
+        columns = {}
+        for name, (dtype, shape, fill_value) in COLUMN_DEFAULTS.items():
+            if new_columns.get(name) is None:
+                new_column = np.full((num_new_rows, *shape), fill_value, dtype=dtype)
+            else:
+                new_column = np.asarray(new_columns[name], dtype=dtype).reshape(
+                    num_new_rows, *shape
+                )
+            columns[name] = np.concatenate([getattr(self, name)[keep], new_column])
+
+        return TrackTable(
+            np.concatenate([self.frame[keep], frame]),
+            np.concatenate(
+                [self.track_id[keep], np.broadcast_to(track_id, frame.shape)]
+            ),
+            np.concatenate(
+                [self.object_id[keep], np.full(num_new_rows, OBJECT_IDS[object])]
+            ),
+            np.concatenate(
+                [self.bounding_box[keep], np.asarray(bounding_box).reshape(-1, 4)]
+            ),
+            self.num_frames,
+            **columns,
+        )
+
+    def replace_object(self, object, frame, track_id, bounding_box):
+        # Returns a new table where all rows of `object` are replaced by the
+        # given detections
+        keep = self.object_id != OBJECT_IDS[object]
+        return self._with_rows(keep, object, frame, track_id, bounding_box)
+
+    def add_rows(self, object, frame, track_id, bounding_box, **columns):
+        keep = np.ones(len(self), dtype=bool)
+        return self._with_rows(keep, object, frame, track_id, bounding_box, **columns)
+
+    def frame_rows(self, frame_num, object=None):
+        # Slice of the rows in `frame_num`, optionally of a single object
+        start, stop = self.frame_offsets[frame_num], self.frame_offsets[frame_num + 1]
+
+        if object is not None:
+            object_ids = self.object_id[start:stop]
+            object_id = OBJECT_IDS[object]
+            start, stop = (
+                start + np.searchsorted(object_ids, object_id, side="left"),
+                start + np.searchsorted(object_ids, object_id, side="right"),
+            )
+
+        return slice(int(start), int(stop))
+
+    def object_rows(self, object):
+        return np.flatnonzero(self.object_id == OBJECT_IDS[object])
+
+    def _build_track_slices(self):
+        order = np.lexsort((self.frame, self.track_id, self.object_id))
+        keys = np.stack([self.object_id[order], self.track_id[order]], axis=1)
+
+        boundaries = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+        starts = np.concatenate([[0], boundaries])
+        stops = np.concatenate([boundaries, [len(order)]])
+
+        self._track_order = order
+        self._track_starts = np.repeat(starts, stops - starts)
+        self._track_slices = {
+            (OBJECT_NAMES[keys[start, 0]], int(keys[start, 1])): (start, stop)
+            for start, stop in zip(starts.tolist(), stops.tolist())
+        }
+
+    def track_order(self):
+        # All rows ordered by object, track_id and frame, and for every
+        # position in that order the position where its track starts
+        if self._track_slices is None:
+            self._build_track_slices()
+
+        return self._track_order, self._track_starts
+
+    def track_rows(self, track_id, object="players"):
+        # Row indices of one track, in frame order
+        if self._track_slices is None:
+            self._build_track_slices()
+
+        start, stop = self._track_slices.get((object, int(track_id)), (0, 0))
+        return self._track_order[start:stop]
+
+    def iter_tracks(self, object="players"):
+        # Yields (track_id, row indices) for every track of `object`
+        if self._track_slices is None:
+            self._build_track_slices()
+
+        for (track_object, track_id), (start, stop) in self._track_slices.items():
+            if track_object == object:
+                yield track_id, self._track_order[start:stop]
+
+    def to_dataframe(self):
+        # One row per detection, vector columns are split into one column
+        # per component
+        data = {
+            "frame": self.frame,
+            "object": np.array(OBJECT_NAMES)[self.object_id],
+            "track_id": self.track_id,
+        }
+
+        for name, column in zip(("x1", "y1", "x2", "y2"), self.bounding_box.T):
+            data[name] = column
+
+        for name, column in self.columns().items():
+            if column.ndim == 2:
+                data[f"{name}_x"], data[f"{name}_y"] = column.T
+            else:
+                data[name] = column
+
+        import pandas as pd
+
+        return pd.DataFrame(data)
+
+    def _row_dicts(self, rows, team_colors=None):
+        bounding_boxes = self.bounding_box[rows].tolist()
+        positions = self.position[rows]
+        positions_adjusted = self.position_adjusted[rows]
+        positions_transformed = self.position_transformed[rows]
+        teams = self.team[rows].tolist()
+        has_ball = self.has_ball[rows].tolist()
+        speeds = self.speed[rows]
+        speeds_smoothed = self.speed_smoothed[rows]
+        distances = self.distance[rows]
+
+        has_position = ~np.isnan(positions[:, 0])
+        has_position_adjusted = ~np.isnan(positions_adjusted[:, 0])
+        has_position_transformed = ~np.isnan(positions_transformed[:, 0])
+        has_speed = ~np.isnan(speeds)
+        has_speed_smoothed = ~np.isnan(speeds_smoothed)
+        has_distance = ~np.isnan(distances)
+
+        positions = positions.tolist()
+        positions_adjusted = positions_adjusted.tolist()
+        positions_transformed = positions_transformed.tolist()
+        speeds = speeds.tolist()
+        speeds_smoothed = speeds_smoothed.tolist()
+        distances = distances.tolist()
+
+        row_dicts = []
+        for i, bounding_box in enumerate(bounding_boxes):
+            track_info = {"bounding_box": bounding_box}
+
+            if has_position[i]:
+                track_info["position"] = tuple(map(int, positions[i]))
+            if has_position_adjusted[i]:
+                track_info["position_adjusted"] = tuple(positions_adjusted[i])
+                track_info["position_transformed"] = (
+                    positions_transformed[i] if has_position_transformed[i] else None
+                )
+            if teams[i]:
+                track_info["team"] = teams[i]
+                if team_colors is not None:
+                    track_info["team_color"] = team_colors[teams[i]]
+            if has_ball[i]:
+                track_info["has_ball"] = True
+            if has_speed[i]:
+                track_info["speed"] = speeds[i]
+            if has_speed_smoothed[i]:
+                track_info["speed_smoothed"] = speeds_smoothed[i]
+            if has_distance[i]:
+                track_info["distance"] = distances[i]
+
+            row_dicts.append(track_info)
+
+        return row_dicts
+
+    def frame_tracks(self, frame_num, team_colors=None):
+        # Legacy per-frame shape: {"players": {track_id: {...}}, ...}
+        frame_tracks = {}
+
+        for object in OBJECT_NAMES:
+            rows = self.frame_rows(frame_num, object)
+            track_ids = self.track_id[rows].tolist()
+            frame_tracks[object] = dict(
+                zip(track_ids, self._row_dicts(rows, team_colors))
+            )
+
+        return frame_tracks
+
+    def to_tracks(self, team_colors=None):
+        # Export to the legacy {"players": [{track_id: {...}}, ...], ...} shape
+        tracks = {
+            object: [{} for _ in range(self.num_frames)] for object in OBJECT_NAMES
+        }
+
+        frames = self.frame.tolist()
+        track_ids = self.track_id.tolist()
+        object_ids = self.object_id.tolist()
+        row_dicts = self._row_dicts(slice(None), team_colors)
+
+        for frame_num, track_id, object_id, track_info in zip(
+            frames, track_ids, object_ids, row_dicts
+        ):
+            tracks[OBJECT_NAMES[object_id]][frame_num][track_id] = track_info
+
+        return tracks
@@ -1,39 +1,179 @@
 import os
+import sys
+import time
 import pickle
+import dataclasses
 import logging
+import resource
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
 import numpy as np
-import pandas as pd
-import supervision as sv
-from ultralytics import YOLO
 
 from src.utils import (
+    blend_rectangle,
     get_bounding_box_width,
     get_center_of_bounding_box,
-    get_foot_position,
+    get_centers_of_bounding_boxes,
+    get_foot_positions,
+    get_frame_count,
+    get_ious,
+    hash_file,
+    hash_source,
+    iter_video,
+    profile_stage,
 )
+from src.possession_stats import PossessionStats
+from .track_table import OBJECT_IDS, TrackTable
+
+# Tracker of a get_object_tracks_parallel worker process, loaded once
+_segment_tracker = None
+
+
+def _init_segment_worker(model_path, tracker_args):
+    global _segment_tracker
+    _segment_tracker = Tracker(model_path, **tracker_args)
+
+
+def _get_segment_tracks(video_path, start, stop, camera_movements):
+    # Worker of get_object_tracks_parallel. Decodes and tracks the frames of
+    # one segment with a fresh ByteTrack.
+    _segment_tracker.reset()
+
+    return _segment_tracker.get_object_tracks(
+        iter_video(video_path, start, stop), camera_movements=camera_movements
+    )
+
+
+def _get_chunk_table(chunk_tracks):
+    # Detections of a chunk of frames, later stages may have added to the
+    # track dicts in the meantime
+    tracks = {
+        object: [
+            {
+                track_id: {"bounding_box": track_info["bounding_box"]}
+                for track_id, track_info in frame_tracks[object].items()
+            }
+            for frame_tracks in chunk_tracks
+        ]
+        for object in OBJECT_IDS
+    }
+
+    return TrackTable.from_tracks(tracks)
+
+
+def _save_cache_table(path, table):
+    table.save(path, extra_columns=())
+
+
+def _save_cache_chunk(path, chunk_tracks):
+    _save_cache_table(path, _get_chunk_table(chunk_tracks))
+
+
+def _load_cache_chunk(path):
+    table = TrackTable.load(path)
+    return [table.frame_tracks(frame_num) for frame_num in range(table.num_frames)]
 
 
 class Tracker:
-    def __init__(self, model_path) -> None:
+    def __init__(
+        self,
+        model_path,
+        batch_size: int | str = 20,
+        conf: float = 0.1,
+        imgsz: int | None = None,
+        detect_every: int = 1,
+        motion_threshold: float | None = None,
+        profiler=None,
+        model=None,
+    ) -> None:
         logging.info("Initializing Tracker with model path: %s", model_path)
-        self.model = YOLO(model_path)
-        self.tracker = sv.ByteTrack()
+        self.model_path = model_path
+
+        # Any object with YOLO's predict, e.g. a stub detector in benchmarks.
+        # The YOLO model and ByteTrack are only created on first use, so
+        # cached and stubbed runs never import ultralytics or supervision.
+        self.custom_model = model
+        self._model = model
+        self._tracker = None
+
+        # batch_size="auto" picks the fastest batch size on the first frame
+        self.batch_size = batch_size
+        self.conf = conf
+        self.imgsz = imgsz
+
+        # Frame skipping: run the model every `detect_every` frames, or
+        # earlier once the camera has moved more than `motion_threshold`
+        # pixels since the last detection. interpolate_track_table fills in
+        # the skipped frames. ByteTrack only sees the detected frames, so
+        # with camera movements given their boxes are shifted by the camera
+        # movement accumulated since the first frame before tracking, which
+        # keeps boxes overlapping across the skipped frames while the camera
+        # pans.
+        self.detect_every = detect_every
+        self.motion_threshold = motion_threshold
+        self.reset_frame_skipping()
+
+        # Optional StageProfiler, times every detection batch
+        self.profiler = profiler
 
     def add_position_to_tracks(self, tracks):
         for object, object_tracks in tracks.items():
-            for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    bounding_box = track_info["bounding_box"]
-                    if object == "ball":
-                        position = get_center_of_bounding_box(bounding_box)
-                    else:
-                        position = get_foot_position(bounding_box)
+            track_infos = [
+                track_info for track in object_tracks for track_info in track.values()
+            ]
+            if not track_infos:
+                continue
+
+            bounding_boxes = [track_info["bounding_box"] for track_info in track_infos]
+            if object == "ball":
+                positions = get_centers_of_bounding_boxes(bounding_boxes)
+            else:
+                positions = get_foot_positions(bounding_boxes)
+
+            for track_info, position in zip(track_infos, positions.tolist()):
+                track_info["position"] = tuple(position)
+
+    def add_position_to_track_table(self, track_table):
+        is_ball = track_table.object_id == OBJECT_IDS["ball"]
+
+        # Center of the bounding box for the ball, foot position otherwise
+        track_table.position[is_ball] = get_centers_of_bounding_boxes(
+            track_table.bounding_box[is_ball]
+        )
+        track_table.position[~is_ball] = get_foot_positions(
+            track_table.bounding_box[~is_ball]
+        )
+
+    @property
+    def model(self):
+        if self._model is None:
+            from ultralytics import YOLO
+
+            logging.info("Loading model %s", self.model_path)
+            self._model = YOLO(self.model_path)
+
+        return self._model
+
+    @property
+    def tracker(self):
+        if self._tracker is None:
+            import supervision as sv
+
+            # Frame rate as ByteTrack sees it, lost tracks are kept for the
+            # same stretch of video with and without frame skipping
+            self._tracker = sv.ByteTrack(frame_rate=30 / self.detect_every)
 
-                    tracks[object][frame_num][track_id]["position"] = position
+        return self._tracker
+
+    @tracker.setter
+    def tracker(self, tracker):
+        self._tracker = tracker
 
     def interpolate_ball_positions(self, ball_positions):
+        import pandas as pd
+
         ball_positions = [x.get(1, {}).get("bounding_box", []) for x in ball_positions]
         df_ball_positions = pd.DataFrame(
             ball_positions, columns=["x1", "y1", "x2", "y2"]
@@ -49,97 +189,644 @@ class Tracker:
 
         return ball_positions
 
-    def detect_frames(self, frames):
-        BATCH_SIZE = 20
-        detections = []
+    def interpolate_ball_track_table(self, track_table):
+        ball_rows = track_table.object_rows("ball")
+        if len(ball_rows) == 0:
+            return track_table
+
+        ball_frames = track_table.frame[ball_rows]
+        ball_bounding_boxes = track_table.bounding_box[ball_rows]
+
+        # Linear interpolation, holding the first/last detection at the edges
+        frames = np.arange(track_table.num_frames)
+        bounding_boxes = np.stack(
+            [
+                np.interp(frames, ball_frames, ball_bounding_boxes[:, i])
+                for i in range(4)
+            ],
+            axis=1,
+        )
+
+        return track_table.replace_object("ball", frames, 1, bounding_boxes)
+
+    def interpolate_track_table(self, track_table, max_gap=None):
+        # Fills gaps of at most `max_gap` frames inside every player and
+        # referee track by linear interpolation of the bounding box. Filled
+        # rows keep the team of the row before the gap.
+        max_gap = max_gap or self.detect_every
+
+        for object in ("players", "referees"):
+            frames, track_ids, bounding_boxes, teams = [], [], [], []
 
-        logging.info(
-            "Starting detection on %d frames with batch size %d",
-            len(frames),
-            BATCH_SIZE,
+            for track_id, rows in track_table.iter_tracks(object):
+                track_frames = track_table.frame[rows]
+                gaps = np.diff(track_frames)
+                gap_starts = np.flatnonzero((gaps > 1) & (gaps <= max_gap))
+
+                if len(gap_starts) == 0:
+                    continue
+
+                missing_frames = np.concatenate(
+                    [
+                        np.arange(track_frames[i] + 1, track_frames[i + 1])
+                        for i in gap_starts
+                    ]
+                )
+                track_bounding_boxes = track_table.bounding_box[rows]
+
+                frames.append(missing_frames)
+                track_ids.append(np.full(len(missing_frames), track_id))
+                teams.append(
+                    np.repeat(track_table.team[rows][gap_starts], gaps[gap_starts] - 1)
+                )
+                bounding_boxes.append(
+                    np.stack(
+                        [
+                            np.interp(
+                                missing_frames,
+                                track_frames,
+                                track_bounding_boxes[:, i],
+                            )
+                            for i in range(4)
+                        ],
+                        axis=1,
+                    )
+                )
+
+            if frames:
+                track_table = track_table.add_rows(
+                    object,
+                    np.concatenate(frames),
+                    np.concatenate(track_ids),
+                    np.concatenate(bounding_boxes),
+                    team=np.concatenate(teams),
+                )
+
+        return track_table
+
+    def reset_frame_skipping(self):
+        self.frames_since_detection = None
+        self.motion_since_detection = 0.0
+        self.camera_offset = np.zeros(2)
+
+    def iter_camera_offsets(self, camera_movements):
+        # Camera movement accumulated up to every frame
+        for camera_movement in camera_movements:
+            self.camera_offset = self.camera_offset + camera_movement
+            yield self.camera_offset
+
+    def should_detect(self, camera_movement=None):
+        if self.frames_since_detection is not None and camera_movement is not None:
+            self.motion_since_detection += float(np.hypot(*camera_movement))
+
+        detect = (
+            self.frames_since_detection is None
+            or self.frames_since_detection + 1 >= self.detect_every
+            or (
+                self.motion_threshold is not None
+                and self.motion_since_detection > self.motion_threshold
+            )
         )
 
-        for i in range(0, len(frames), BATCH_SIZE):
-            logging.debug(
-                "Processing batch from frame %d to %d",
-                i,
-                min(i + BATCH_SIZE, len(frames)),
+        if detect:
+            self.frames_since_detection = 0
+            self.motion_since_detection = 0.0
+        else:
+            self.frames_since_detection += 1
+
+        return detect
+
+    def predict(self, batch):
+        predict_args = {"conf": self.conf}
+        if self.imgsz is not None:
+            predict_args["imgsz"] = self.imgsz
+
+        return self.model.predict(batch, **predict_args)
+
+    def tune_batch_size(
+        self, frame, candidates=(1, 2, 4, 8, 16, 32), max_memory_mb=None
+    ):
+        # Times a batch of copies of `frame` for every candidate and returns
+        # the batch size with the best throughput. Stops early once
+        # throughput drops or peak RSS grows past `max_memory_mb`.
+        self.predict([frame])  # warm up
+
+        best_batch_size, best_fps = candidates[0], 0.0
+
+        for batch_size in candidates:
+            start = time.perf_counter()
+            self.predict([frame] * batch_size)
+            latency = time.perf_counter() - start
+
+            fps = batch_size / latency
+            peak_memory_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+            logging.info(
+                "Batch size %d: %.3fs per batch, %.1f frames/s, peak RSS %.0f MB",
+                batch_size,
+                latency,
+                fps,
+                peak_memory_mb,
             )
-            batch_detections = self.model.predict(frames[i : i + BATCH_SIZE], conf=0.1)
-            detections += batch_detections
+
+            if max_memory_mb is not None and peak_memory_mb > max_memory_mb:
+                break
+            if fps <= best_fps:
+                break
+
+            best_batch_size, best_fps = batch_size, fps
+
+        logging.info("Selected batch size %d", best_batch_size)
+
+        return best_batch_size
+
+    def iter_detections(self, frames, camera_movements=None):
+        # Yields (frame, detection) pairs. `frames` may be any iterable, only
+        # one batch of frames is held in memory at a time. With frame
+        # skipping, skipped frames are yielded with a None detection;
+        # `camera_movements` (aligned with `frames`) enables the motion
+        # trigger.
+        frames = iter(frames)
+
+        if self.batch_size == "auto":
+            first_frame = next(frames, None)
+            if first_frame is None:
+                return
+
+            self.batch_size = self.tune_batch_size(first_frame)
+            frames = itertools.chain([first_frame], frames)
+
+        if camera_movements is None:
+            camera_movements = itertools.repeat(None)
+
+        logging.info("Starting detection with batch size %d", self.batch_size)
+
+        pending_frames, detect_frames = [], []
+        num_frames = 0
+
+        def flush():
             logging.debug(
-                "Batch detection completed, total detections: %d", len(detections)
+                "Processing batch of %d frames from frame %d to %d",
+                len(detect_frames),
+                num_frames - len(pending_frames),
+                num_frames,
             )
+            with profile_stage(
+                self.profiler,
+                "detection_batch",
+                items=len(detect_frames),
+                record_calls=True,
+            ):
+                batch_detections = iter(
+                    self.predict(detect_frames) if detect_frames else []
+                )
+            logging.debug("Batch detection completed, total frames: %d", num_frames)
+
+            for frame, detect in pending_frames:
+                yield frame, next(batch_detections) if detect else None
+
+        for frame, camera_movement in zip(frames, camera_movements):
+            detect = self.should_detect(camera_movement)
 
-        return detections
+            pending_frames.append((frame, detect))
+            if detect:
+                detect_frames.append(frame)
+            num_frames += 1
 
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
+            if len(detect_frames) == self.batch_size:
+                yield from flush()
+                pending_frames, detect_frames = [], []
+
+        if pending_frames:
+            yield from flush()
+
+    def detect_frames(self, frames):
+        return [detection for _, detection in self.iter_detections(frames)]
+
+    def get_frame_tracks(self, detection, camera_offset=None):
+        import supervision as sv
+
+        # {0: {bounding_box:[0,0,0,0]}, 1: {bounding_box:[0,0,0,0]}, ...}
+        frame_tracks = {"players": {}, "referees": {}, "ball": {}}
+
+        # Frame skipped by frame skipping
+        if detection is None:
+            return frame_tracks
+
+        class_names = detection.names
+        class_names_inverse = {value: key for key, value in class_names.items()}
+
+        detection_supervision = sv.Detections.from_ultralytics(detection)
+
+        for object_idx, class_id in enumerate(detection_supervision.class_id):
+            if class_names[class_id] == "goalkeeper":
+                detection_supervision.class_id[object_idx] = class_names_inverse[
+                    "player"
+                ]
+
+        # Tracked in camera-compensated coordinates, reported as detected.
+        # ByteTrack sets tracker ids on the detections it is given, tracking
+        # a copy keeps them off the detections the ball is read from.
+        xyxy = detection_supervision.xyxy
+        if camera_offset is not None:
+            shift = np.tile(camera_offset, 2)
+            xyxy = xyxy + shift
+        tracked_supervision = dataclasses.replace(detection_supervision, xyxy=xyxy)
+
+        detection_with_tracks = self.tracker.update_with_detections(tracked_supervision)
+
+        # Without any active track ByteTrack returns every detection with an
+        # empty tracker_id
+        if detection_with_tracks.tracker_id is None or len(
+            detection_with_tracks.tracker_id
+        ) != len(detection_with_tracks):
+            detection_with_tracks = detection_with_tracks[[]]
+
+        if camera_offset is not None:
+            detection_with_tracks.xyxy = (detection_with_tracks.xyxy - shift).astype(
+                detection_supervision.xyxy.dtype
+            )
+
+        BOUNDING_BOX_IDX = 0
+        CLASS_ID_IDX = 3
+        TRACK_ID_IDX = 4
+
+        for frame_detection in detection_with_tracks:
+            bounding_box = frame_detection[BOUNDING_BOX_IDX].tolist()
+            class_id = frame_detection[CLASS_ID_IDX]
+            track_id = frame_detection[TRACK_ID_IDX]
+
+            if class_id == class_names_inverse["player"]:
+                frame_tracks["players"][track_id] = {"bounding_box": bounding_box}
+            if class_id == class_names_inverse["referee"]:
+                frame_tracks["referees"][track_id] = {"bounding_box": bounding_box}
+
+        for frame_detection in detection_supervision:
+            bounding_box = frame_detection[BOUNDING_BOX_IDX].tolist()
+            class_id = frame_detection[CLASS_ID_IDX]
+
+            if class_id == class_names_inverse["ball"]:
+                frame_tracks["ball"][1] = {"bounding_box": bounding_box}
+
+        return frame_tracks
+
+    def iter_object_tracks(self, frames, camera_movements=None):
+        # Streaming variant of get_object_tracks, yields (frame, frame_tracks)
+        camera_offsets = itertools.repeat(None)
+        if camera_movements is not None and self.detect_every > 1:
+            camera_movements, offset_movements = itertools.tee(camera_movements)
+            camera_offsets = self.iter_camera_offsets(offset_movements)
+
+        for (frame, detection), camera_offset in zip(
+            self.iter_detections(frames, camera_movements), camera_offsets
+        ):
+            with profile_stage(self.profiler, "tracking", items=1):
+                frame_tracks = self.get_frame_tracks(detection, camera_offset)
+
+            yield frame, frame_tracks
+
+    def reset(self):
+        # Start tracking a new video, track ids start from 1 again. Before
+        # ByteTrack is created only the track id counter, shared by all
+        # ByteTrack instances, may need a reset, and only if supervision has
+        # been loaded at all.
+        if self._tracker is not None:
+            self._tracker.reset()
+        elif "supervision" in sys.modules:
+            from supervision.tracker.byte_tracker.basetrack import BaseTrack
+
+            BaseTrack.reset_counter()
+        self.reset_frame_skipping()
+
+    def get_tracking_state(self):
+        # Tracker state after the last frame. Track ids come from a counter
+        # shared by all ByteTrack instances, so it is saved alongside.
+        from supervision.tracker.byte_tracker.basetrack import BaseTrack
+
+        return pickle.dumps(
+            (
+                self.tracker,
+                BaseTrack._count,
+                self.frames_since_detection,
+                self.motion_since_detection,
+                self.camera_offset,
+            )
+        )
+
+    def set_tracking_state(self, state):
+        from supervision.tracker.byte_tracker.basetrack import BaseTrack
+
+        (
+            self.tracker,
+            BaseTrack._count,
+            self.frames_since_detection,
+            self.motion_since_detection,
+            self.camera_offset,
+        ) = pickle.loads(state)
+
+    def get_cache_key(self):
+        # Everything the tracks of a given video depend on
+        return {
+            "model": hash_file(self.model_path),
+            "code": hash_source(Tracker),
+            "batch_size": self.batch_size,
+            "conf": self.conf,
+            "imgsz": self.imgsz,
+            "detect_every": self.detect_every,
+            "motion_threshold": self.motion_threshold,
+        }
+
+    def iter_cached_object_tracks(self, frames, camera_movements, cache):
+        # iter_object_tracks backed by a StageCacheView. Tracking is
+        # sequential, so every chunk of frames is stored with the ByteTrack
+        # state it ended with and the next chunk continues from there.
+        self.reset()
+
+        if camera_movements is None:
+            camera_movements = itertools.repeat(None)
+
+        def process(items):
+            items, frames, camera_movements = itertools.tee(items, 3)
+            tracked_frames = self.iter_object_tracks(
+                (frame for frame, _ in frames),
+                (camera_movement for _, camera_movement in camera_movements),
+            )
+            for item, (_, frame_tracks) in zip(items, tracked_frames):
+                yield item, frame_tracks
+
+        for (frame, _), frame_tracks in cache.iter_chunks(
+            zip(frames, camera_movements),
+            process,
+            self.get_tracking_state,
+            self.set_tracking_state,
+            _save_cache_chunk,
+            _load_cache_chunk,
+        ):
+            yield frame, frame_tracks
+
+    def get_object_track_table(
+        self, frames, camera_movements=None, cache=None, team_crops=None
+    ):
+        # get_object_tracks as a TrackTable. With a StageCacheView, cached
+        # chunks are memory-mapped tables straight from the cache and only
+        # uncached chunks are tracked, starting from the state the chunk
+        # before ended with. Frames of cached chunks are only looked at for
+        # team crops.
+        if cache is None:
+            tracks = self.get_object_tracks(
+                frames, camera_movements=camera_movements, team_crops=team_crops
+            )
+            return TrackTable.from_tracks(tracks)
+
+        logging.info("Detecting frames for tracking")
+        self.reset()
+
+        frames = iter(frames)
+        if camera_movements is None:
+            camera_movements = itertools.repeat(None)
+        camera_movements = iter(camera_movements)
+
+        tables = []
+        state = None
+
+        for chunk_num in itertools.count():
+            cached = cache.get(chunk_num, TrackTable.load)
+
+            if cached is not None:
+                logging.debug("Cache hit: %s chunk %d", cache.stage, chunk_num)
+                table, state = cached
+
+                for frame_num, frame, _ in zip(
+                    range(table.num_frames), frames, camera_movements
+                ):
+                    if team_crops is not None:
+                        players = table.frame_tracks(frame_num)["players"]
+                        team_crops.add_frame(frame, players)
+            else:
+                if state is not None:
+                    self.set_tracking_state(pickle.loads(state))
+                    state = None
+
+                chunk_tracks = []
+                for frame, frame_tracks in self.iter_object_tracks(
+                    itertools.islice(frames, cache.chunk_size),
+                    itertools.islice(camera_movements, cache.chunk_size),
+                ):
+                    if team_crops is not None:
+                        team_crops.add_frame(frame, frame_tracks["players"])
+                    chunk_tracks.append(frame_tracks)
+
+                if not chunk_tracks:
+                    break
+
+                table = _get_chunk_table(chunk_tracks)
+                cache.put(
+                    chunk_num, _save_cache_table, table, self.get_tracking_state()
+                )
+
+            tables.append(table)
+            if table.num_frames < cache.chunk_size:
+                break
+
+        return TrackTable.concat(tables)
+
+    def get_object_tracks(
+        self,
+        frames,
+        read_from_stub=False,
+        stub_path=None,
+        camera_movements=None,
+        cache=None,
+        team_crops=None,
+    ):
+        # With a TeamCropBuffer, the jersey crops for team assignment are
+        # gathered from the frames as they are tracked
         if read_from_stub and stub_path is not None and os.path.exists(stub_path):
             logging.info("Reading tracks from stub file: %s", stub_path)
-            with open(stub_path, "rb") as f:
-                tracks = pickle.load(f)
+
+            # Legacy pickle stubs, the columnar TrackTable format otherwise
+            if str(stub_path).endswith(".pkl"):
+                with open(stub_path, "rb") as f:
+                    tracks = pickle.load(f)
+            else:
+                tracks = TrackTable.load(stub_path).to_tracks()
             return tracks
 
         logging.info("Detecting frames for tracking")
-        detections = self.detect_frames(frames)
 
+        # [
+        #   {0: {bounding_box:[0,0,0,0]}, 1: {bounding_box:[0,0,0,0]}, ...},
+        #   {0: {bounding_box:[0,0,0,0]}, 1: {bounding_box:[0,0,0,0]}, ...}
+        # ]
         tracks = {"players": [], "referees": [], "ball": []}
 
-        for frame_num, detection in enumerate(detections):
-            class_names = detection.names
-            class_names_inverse = {value: key for key, value in class_names.items()}
+        if cache is not None:
+            tracked_frames = self.iter_cached_object_tracks(
+                frames, camera_movements, cache
+            )
+        else:
+            tracked_frames = self.iter_object_tracks(frames, camera_movements)
 
-            detection_supervision = sv.Detections.from_ultralytics(detection)
+        for frame, frame_tracks in tracked_frames:
+            if team_crops is not None:
+                team_crops.add_frame(frame, frame_tracks["players"])
 
-            for object_idx, class_id in enumerate(detection_supervision.class_id):
-                if class_names[class_id] == "goalkeeper":
-                    detection_supervision.class_id[object_idx] = class_names_inverse[
-                        "player"
-                    ]
+            for object, track in frame_tracks.items():
+                tracks[object].append(track)
 
-            detection_with_tracks = self.tracker.update_with_detections(
-                detection_supervision
+        if stub_path is not None:
+            logging.info("Saving tracks to stub file: %s", stub_path)
+            if str(stub_path).endswith(".pkl"):
+                with open(stub_path, "wb") as f:
+                    pickle.dump(tracks, f)
+            else:
+                TrackTable.from_tracks(tracks).save(stub_path)
+
+        return tracks
+
+    def get_tracker_args(self):
+        # Arguments that recreate this tracker in another process
+        return {
+            "batch_size": self.batch_size,
+            "conf": self.conf,
+            "imgsz": self.imgsz,
+            "detect_every": self.detect_every,
+            "motion_threshold": self.motion_threshold,
+            # A model passed in instead of loaded from model_path goes along
+            "model": self.custom_model,
+        }
+
+    def get_object_tracks_parallel(
+        self,
+        video_path,
+        num_workers=None,
+        segment_size=None,
+        overlap=30,
+        camera_movements=None,
+        min_iou=0.5,
+    ):
+        # get_object_tracks split into segments of `segment_size` frames
+        # (one per worker by default), each tracked in a separate process.
+        # Every segment is also tracked `overlap` frames into the next one,
+        # and merge_segment_tracks joins the segments through those frames.
+        num_workers = num_workers or os.cpu_count()
+        frame_count = get_frame_count(video_path)
+
+        if segment_size is None:
+            segment_size = -(-max(frame_count, 1) // num_workers)
+        starts = list(range(0, max(frame_count, 1), segment_size))
+
+        # The frame count is approximate, the last segment reads to the end
+        stops = [start + overlap for start in starts[1:]] + [None]
+
+        segment_camera_movements = [
+            camera_movements[start:stop] if camera_movements is not None else None
+            for start, stop in zip(starts, stops)
+        ]
+
+        with ProcessPoolExecutor(
+            max_workers=min(num_workers, len(starts)),
+            initializer=_init_segment_worker,
+            initargs=(self.model_path, self.get_tracker_args()),
+        ) as pool:
+            segment_tracks = list(
+                pool.map(
+                    _get_segment_tracks,
+                    itertools.repeat(video_path),
+                    starts,
+                    stops,
+                    segment_camera_movements,
+                )
             )
 
-            # [
-            #   {0: {bounding_box:[0,0,0,0]}, 1: {bounding_box:[0,0,0,0]}, ...},
-            #   {0: {bounding_box:[0,0,0,0]}, 1: {bounding_box:[0,0,0,0]}, ...}
-            # ]
-            # FOR EACH FRAME a new blank dict is added (CONCERN RESOLVED)
-            tracks["players"].append({})
-            tracks["referees"].append({})
-            tracks["ball"].append({})
-
-            BOUNDING_BOX_IDX = 0
-            CLASS_ID_IDX = 3
-            TRACK_ID_IDX = 4
-
-            for frame_detection in detection_with_tracks:
-                bounding_box = frame_detection[BOUNDING_BOX_IDX].tolist()
-                class_id = frame_detection[CLASS_ID_IDX]
-                track_id = frame_detection[TRACK_ID_IDX]
-
-                if class_id == class_names_inverse["player"]:
-                    tracks["players"][frame_num][track_id] = {
-                        "bounding_box": bounding_box
-                    }
-                if class_id == class_names_inverse["referee"]:
-                    tracks["referees"][frame_num][track_id] = {
-                        "bounding_box": bounding_box
-                    }
-
-            for frame_detection in detection_supervision:
-                bounding_box = frame_detection[BOUNDING_BOX_IDX].tolist()
-                class_id = frame_detection[CLASS_ID_IDX]
-                track_id = frame_detection[TRACK_ID_IDX]
-
-                if class_id == class_names_inverse["ball"]:
-                    tracks["ball"][frame_num][1] = {"bounding_box": bounding_box}
+        return self.merge_segment_tracks(starts, segment_tracks, min_iou)
 
-        if stub_path is not None:
-            logging.info("Saving tracks to stub file: %s", stub_path)
-            with open(stub_path, "wb") as f:
-                pickle.dump(tracks, f)
+    def match_segment_tracks(self, tracks, segment, start, overlap, min_iou=0.5):
+        # Track ids of `segment` matched to the ids of `tracks` in the
+        # `overlap` frames from `start` both cover. Tracks are paired one to
+        # one by their mean IoU over the frames the segment track is in.
+        from scipy.optimize import linear_sum_assignment
+
+        track_id_map = {}
+
+        for object in ("players", "referees"):
+            iou_sums, frame_counts = {}, {}
+
+            # The last segment may end inside the overlap
+            num_frames = min(overlap, len(tracks[object]) - start, len(segment[object]))
+            for frame_num in range(start, start + num_frames):
+                segment_frame_tracks = segment[object][frame_num - start]
+                frame_tracks = tracks[object][frame_num]
+
+                for segment_id in segment_frame_tracks:
+                    frame_counts[segment_id] = frame_counts.get(segment_id, 0) + 1
+
+                if not segment_frame_tracks or not frame_tracks:
+                    continue
+
+                segment_ids, track_ids = list(segment_frame_tracks), list(frame_tracks)
+                ious = get_ious(
+                    [track["bounding_box"] for track in segment_frame_tracks.values()],
+                    [track["bounding_box"] for track in frame_tracks.values()],
+                )
+
+                for i, j in zip(*np.nonzero(ious)):
+                    key = (segment_ids[i], track_ids[j])
+                    iou_sums[key] = iou_sums.get(key, 0.0) + ious[i, j]
+
+            if not iou_sums:
+                continue
+
+            segment_ids = sorted({segment_id for segment_id, _ in iou_sums})
+            track_ids = sorted({track_id for _, track_id in iou_sums})
+
+            mean_ious = np.zeros((len(segment_ids), len(track_ids)))
+            for (segment_id, track_id), iou_sum in iou_sums.items():
+                mean_ious[segment_ids.index(segment_id), track_ids.index(track_id)] = (
+                    iou_sum / frame_counts[segment_id]
+                )
+
+            for i, j in zip(*linear_sum_assignment(mean_ious, maximize=True)):
+                if mean_ious[i, j] >= min_iou:
+                    track_id_map[segment_ids[i]] = track_ids[j]
+
+        return track_id_map
+
+    def merge_segment_tracks(self, starts, segment_tracks, min_iou=0.5):
+        # Joins the tracks of segments starting at frames `starts`. Frames
+        # covered by two segments are taken from the earlier one, where the
+        # tracks are settled. Tracks of a later segment keep the id of the
+        # track they match in those frames and get a new id otherwise.
+        tracks = {"players": [], "referees": [], "ball": []}
+        next_track_id = 1
+
+        for start, segment in zip(starts, segment_tracks):
+            overlap = len(tracks["players"]) - start
+            if overlap < 0:
+                raise ValueError(f"Segment at frame {start} leaves a gap")
+
+            # The first segment keeps its ByteTrack ids
+            track_id_map = {}
+            if start > 0:
+                track_id_map = self.match_segment_tracks(
+                    tracks, segment, start, overlap, min_iou
+                )
+
+            tracks["ball"] += segment["ball"][overlap:]
+
+            for frame_num in range(overlap, len(segment["players"])):
+                for object in ("players", "referees"):
+                    frame_tracks = {}
+
+                    for track_id, track in segment[object][frame_num].items():
+                        if track_id not in track_id_map:
+                            track_id_map[track_id] = (
+                                track_id if start == 0 else next_track_id
+                            )
+                        frame_tracks[track_id_map[track_id]] = track
+                        next_track_id = max(next_track_id, track_id_map[track_id] + 1)
+
+                    tracks[object].append(frame_tracks)
 
         return tracks
 
@@ -210,35 +897,16 @@ class Tracker:
 
         return frame
 
-    def draw_team_ball_control(self, frame, frame_num, team_ball_control):
+    def draw_team_ball_control(self, frame, frame_num, possession_stats):
         # Draw a semi-transparent rectangle
-        overlay = frame.copy()
-        cv2.rectangle(
-            overlay,
-            (1350, 850),
-            (1900, 970),
-            (255, 255, 255),
-            -1,
-        )
         alpha = 0.4  # for transparency
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-
-        team_ball_control_till_frame = team_ball_control[: frame_num + 1]
-
-        # Get the number of times each team had the ball
-        team_1_num_frames = team_ball_control_till_frame[
-            team_ball_control_till_frame == 1
-        ].shape[0]
-        team_2_num_frames = team_ball_control_till_frame[
-            team_ball_control_till_frame == 2
-        ].shape[0]
+        blend_rectangle(frame, (1350, 850), (1900, 970), (255, 255, 255), alpha)
 
-        team_1 = team_1_num_frames / (team_1_num_frames + team_2_num_frames)
-        team_2 = team_2_num_frames / (team_1_num_frames + team_2_num_frames)
+        team_1, team_2 = possession_stats.frame_possession(frame_num).tolist()
 
         cv2.putText(
             frame,
-            f"Team 1 Ball Control: {team_1*100:.2f}%",
+            f"Team 1 Ball Control: {team_1:.2f}%",
             (1400, 900),
             cv2.FONT_HERSHEY_SIMPLEX,
             1,
@@ -247,7 +915,7 @@ class Tracker:
         )
         cv2.putText(
             frame,
-            f"Team 2 Ball Control: {team_2*100:.2f}%",
+            f"Team 2 Ball Control: {team_2:.2f}%",
             (1400, 950),
             cv2.FONT_HERSHEY_SIMPLEX,
             1,
@@ -257,46 +925,50 @@ class Tracker:
 
         return frame
 
-    def draw_annotations(self, video_frames, tracks, team_ball_control):
-        output_video_frames = []
+    def draw_frame_annotations(self, frame, frame_num, tracks, possession_stats):
+        # Draws in place on `frame`
+        player_dict = tracks["players"][frame_num]
+        ball_dict = tracks["ball"][frame_num]
+        referee_dict = tracks["referees"][frame_num]
 
-        for (
-            frame_num,
-            frame,
-        ) in enumerate(video_frames):
-            frame = frame.copy()
+        # Draw players
+        RED = (0, 0, 255)
 
-            player_dict = tracks["players"][frame_num]
-            ball_dict = tracks["ball"][frame_num]
-            referee_dict = tracks["referees"][frame_num]
+        for track_id, player in player_dict.items():
+            team_color = player.get("team_color", RED)
+            frame = self.draw_ellipse(
+                frame, player["bounding_box"], team_color, track_id
+            )
 
-            # Draw players
-            RED = (0, 0, 255)
+            if player.get("has_ball", False):
+                frame = self.draw_triangle(frame, player["bounding_box"], RED)
 
-            for track_id, player in player_dict.items():
-                team_color = player.get("team_color", RED)
-                frame = self.draw_ellipse(
-                    frame, player["bounding_box"], team_color, track_id
-                )
+        # Draw referees
+        YELLOW = (0, 255, 255)
 
-                if player.get("has_ball", False):
-                    frame = self.draw_triangle(frame, player["bounding_box"], RED)
+        for track_id, referee in referee_dict.items():
+            frame = self.draw_ellipse(frame, referee["bounding_box"], YELLOW)
 
-            # Draw referees
-            YELLOW = (0, 255, 255)
+        # Draw ball
+        GREEN = (0, 255, 0)
 
-            for track_id, referee in referee_dict.items():
-                frame = self.draw_ellipse(frame, referee["bounding_box"], YELLOW)
+        for track_id, ball in ball_dict.items():
+            frame = self.draw_triangle(frame, ball["bounding_box"], GREEN)
 
-            # Draw ball
-            GREEN = (0, 255, 0)
+        # Draw Team Ball Control
 
-            for track_id, ball in ball_dict.items():
-                frame = self.draw_triangle(frame, ball["bounding_box"], GREEN)
+        frame = self.draw_team_ball_control(frame, frame_num, possession_stats)
 
-            # Draw Team Ball Control
+        return frame
 
-            frame = self.draw_team_ball_control(frame, frame_num, team_ball_control)
+    def draw_annotations(self, video_frames, tracks, team_ball_control):
+        output_video_frames = []
+        possession_stats = PossessionStats(team_ball_control)
+
+        for frame_num, frame in enumerate(video_frames):
+            frame = self.draw_frame_annotations(
+                frame.copy(), frame_num, tracks, possession_stats
+            )
 
             output_video_frames.append(frame)
 
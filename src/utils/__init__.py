@@ -1,8 +1,21 @@
-from .video_utils import read_video, save_video
+from .video_utils import (
+    read_video,
+    save_video,
+    iter_video,
+    get_frame_count,
+)
 from .bounding_box_utils import (
     get_bounding_box_width,
     get_center_of_bounding_box,
     measure_distance,
     measure_xy_distance,
     get_foot_position,
+    get_centers_of_bounding_boxes,
+    get_foot_positions,
+    get_ious,
 )
+from .draw_utils import blend_rectangle
+from .staged_executor import StagedExecutor
+from .stage_cache import StageCache, hash_file, hash_source
+from .profiler import StageProfiler, profile_stage
+from .video_source import VideoSource
@@ -22,3 +22,37 @@ def measure_xy_distance(p1, p2):
 def get_foot_position(bounding_box):
     x1, y1, x2, y2 = bounding_box
     return int((x1 + x2) / 2), int(y2)
+
+
+# Batched variants over an (N, 4) array of bounding boxes, returning (N, 2)
+# integer positions truncated the same way as the single-box helpers.
+def get_centers_of_bounding_boxes(bounding_boxes):
+    bounding_boxes = np.asarray(bounding_boxes, dtype=np.float64).reshape(-1, 4)
+    centers = (bounding_boxes[:, 0:2] + bounding_boxes[:, 2:4]) / 2
+    return centers.astype(np.int64)
+
+
+def get_foot_positions(bounding_boxes):
+    bounding_boxes = np.asarray(bounding_boxes, dtype=np.float64).reshape(-1, 4)
+    x = (bounding_boxes[:, 0] + bounding_boxes[:, 2]) / 2
+    return np.stack([x, bounding_boxes[:, 3]], axis=1).astype(np.int64)
+
+
+def get_ious(bounding_boxes_1, bounding_boxes_2):
+    # (N, 4) x (M, 4) -> (N, M) intersection over union
+    bounding_boxes_1 = np.asarray(bounding_boxes_1, dtype=np.float64).reshape(-1, 4)
+    bounding_boxes_2 = np.asarray(bounding_boxes_2, dtype=np.float64).reshape(-1, 4)
+
+    x1 = np.maximum(bounding_boxes_1[:, None, 0], bounding_boxes_2[None, :, 0])
+    y1 = np.maximum(bounding_boxes_1[:, None, 1], bounding_boxes_2[None, :, 1])
+    x2 = np.minimum(bounding_boxes_1[:, None, 2], bounding_boxes_2[None, :, 2])
+    y2 = np.minimum(bounding_boxes_1[:, None, 3], bounding_boxes_2[None, :, 3])
+
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_1 = np.prod(bounding_boxes_1[:, 2:] - bounding_boxes_1[:, :2], axis=1)
+    area_2 = np.prod(bounding_boxes_2[:, 2:] - bounding_boxes_2[:, :2], axis=1)
+    union = area_1[:, None] + area_2[None, :] - intersection
+
+    return np.divide(
+        intersection, union, out=np.zeros_like(intersection), where=union > 0
+    )
@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+# Solid color layers per (height, width, color), built once and reused by
+# every frame
+_overlay_layers = {}
+
+
+def get_overlay_layer(height, width, color):
+    key = (height, width, tuple(color))
+
+    if key not in _overlay_layers:
+        _overlay_layers[key] = np.full((height, width, 3), color, dtype=np.uint8)
+
+    return _overlay_layers[key]
+
+
+def blend_rectangle(frame, top_left, bottom_right, color, alpha):
+    # Same result as drawing a filled rectangle on a copy of the frame and
+    # blending the whole copy back, but only the pixels inside the rectangle
+    # are touched. Draws in place on `frame`.
+    x1, y1 = max(top_left[0], 0), max(top_left[1], 0)
+    x2 = min(bottom_right[0] + 1, frame.shape[1])
+    y2 = min(bottom_right[1] + 1, frame.shape[0])
+
+    if x1 >= x2 or y1 >= y2:
+        return frame
+
+    roi = frame[y1:y2, x1:x2]
+    layer = get_overlay_layer(y2 - y1, x2 - x1, color)
+    cv2.addWeighted(layer, alpha, roi, 1 - alpha, 0, roi)
+
+    return frame
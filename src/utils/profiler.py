@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import cProfile
+import logging
+import resource
+import threading
+from pathlib import Path
+from contextlib import contextmanager, nullcontext
+
+
+def get_peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_rss_mb():
+    # Current RSS, None where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def profile_stage(profiler, name, **kwargs):
+    # StageProfiler.stage, or nothing without a profiler
+    if profiler is None:
+        return nullcontext({})
+
+    return profiler.stage(name, **kwargs)
+
+
+class StageProfiler:
+    # Records wall time, CPU time (whole process), RSS and throughput of
+    # named pipeline stages. RSS is read before and after every call and
+    # the growth summed per stage, it is process-wide like CPU time so
+    # stages running at once on several threads see each other's memory.
+    # Calls of the same stage are aggregated, stages timed with
+    # `record_calls` (e.g. detection batches) also keep every call. Stages
+    # listed in `cprofile_stages` ("all" for every stage) are run under
+    # cProfile and dumped to `<profile_dir>/<stage>.prof`.
+    def __init__(self, cprofile_stages=(), profile_dir=None) -> None:
+        self.cprofile_stages = cprofile_stages
+        self.profile_dir = profile_dir
+
+        self.stages = {}
+        self.calls = []
+        self.profiles = {}
+
+        # Stages may be timed from worker threads of a StagedExecutor
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+        self.start_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+
+    def is_cprofiled(self, name):
+        return self.cprofile_stages == "all" or name in self.cprofile_stages
+
+    @contextmanager
+    def stage(self, name, items=None, record_calls=False):
+        # Yields a dict, setting its "items" inside the block overrides
+        # `items` for stages that only know their count at the end
+        call = {"items": items}
+
+        # Stages nested in a profiled stage show up in its profile, only
+        # one profiler can be active per thread
+        profile = None
+        if self.is_cprofiled(name) and not getattr(self.local, "profiling", False):
+            profile = self.profiles.setdefault(name, cProfile.Profile())
+            try:
+                profile.enable()
+                self.local.profiling = True
+            except ValueError:
+                # Python 3.12+ allows one active profiler per process, e.g.
+                # for stages timed at once on several threads
+                logging.debug("Stage %s not profiled, profiler busy", name)
+                profile = None
+
+        logging.debug("Stage %s started", name)
+        start = time.perf_counter()
+        start_cpu_time = time.process_time()
+        start_rss_mb = get_rss_mb()
+
+        try:
+            yield call
+        finally:
+            wall_seconds = time.perf_counter() - start
+            cpu_seconds = time.process_time() - start_cpu_time
+
+            if profile is not None:
+                profile.disable()
+                self.local.profiling = False
+
+            logging.debug("Stage %s took %.3fs", name, wall_seconds)
+            self.add(
+                name,
+                wall_seconds,
+                cpu_seconds,
+                call["items"],
+                record_calls,
+                start_rss_mb,
+            )
+
+    def wrap(self, name, func):
+        # `func` with every call timed as a call of stage `name`
+        def timed(*args, **kwargs):
+            with self.stage(name, items=1):
+                return func(*args, **kwargs)
+
+        return timed
+
+    def add(
+        self,
+        name,
+        wall_seconds,
+        cpu_seconds,
+        items=None,
+        record_calls=False,
+        start_rss_mb=None,
+    ):
+        rss_mb = get_rss_mb()
+        rss_delta_mb = (
+            rss_mb - start_rss_mb
+            if rss_mb is not None and start_rss_mb is not None
+            else None
+        )
+
+        with self.lock:
+            stage = self.stages.setdefault(
+                name,
+                {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "items": 0},
+            )
+            stage["calls"] += 1
+            stage["wall_seconds"] += wall_seconds
+            stage["cpu_seconds"] += cpu_seconds
+            stage["items"] += items or 0
+            stage["rss_mb"] = rss_mb
+            if rss_delta_mb is not None:
+                stage["rss_delta_mb"] = stage.get("rss_delta_mb", 0.0) + rss_delta_mb
+
+            if record_calls:
+                self.calls.append(
+                    {
+                        "stage": name,
+                        "items": items,
+                        "wall_seconds": wall_seconds,
+                        "cpu_seconds": cpu_seconds,
+                        "rss_mb": rss_mb,
+                        "rss_delta_mb": rss_delta_mb,
+                    }
+                )
+
+    def report(self):
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = dict(
+                stage,
+                items_per_second=(
+                    stage["items"] / stage["wall_seconds"]
+                    if stage["items"] and stage["wall_seconds"] > 0
+                    else None
+                ),
+            )
+
+        return {
+            "wall_seconds": time.perf_counter() - self.start_time,
+            "cpu_seconds": time.process_time() - self.start_cpu_time,
+            # Peak over the whole run, per-stage memory is in the stages
+            "peak_rss_mb": get_peak_rss_mb(),
+            "rss_mb": get_rss_mb(),
+            "stages": stages,
+            "calls": self.calls,
+        }
+
+    def save(self, path):
+        report = self.report()
+
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        if self.profile_dir is not None:
+            for name, profile in self.profiles.items():
+                profile.dump_stats(Path(self.profile_dir, f"{name}.prof"))
+
+        logging.info("Saved profile to %s", path)
+
+        return report
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import pickle
+import shutil
+import hashlib
+import inspect
+import tempfile
+import logging
+import itertools
+from pathlib import Path
+
+_file_hashes = {}
+
+
+def hash_file(path, block_size=1 << 20):
+    # Content hash of a file, memoized per (path, size, mtime). Paths that do
+    # not exist hash to their name.
+    path = Path(path)
+    if not path.exists():
+        return hashlib.sha256(str(path).encode()).hexdigest()
+
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        _file_hashes[memo_key] = digest.hexdigest()
+
+    return _file_hashes[memo_key]
+
+
+def hash_source(obj):
+    # Code version of a stage: hash of the module source `obj` is defined in
+    module = sys.modules[obj.__module__]
+    return hashlib.sha256(inspect.getsource(module).encode()).hexdigest()
+
+
+class StageCache:
+    # Content-addressed, size-bounded LRU cache of per-stage results stored
+    # under `cache_dir/<stage>/`. Stage results over frames are stored in
+    # chunks of `chunk_size` frames, so a partial rerun can reuse every chunk
+    # that was finished before. Every entry is a directory the stage writes
+    # its results into in its own format, e.g. a TrackTable.
+    def __init__(
+        self, cache_dir, max_size_mb: float = 10240, chunk_size: int = 500
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.chunk_size = chunk_size
+
+    def stage(self, name, **key_parts):
+        key_parts = dict(key_parts, stage=name, chunk_size=self.chunk_size)
+        key = hashlib.sha256(
+            json.dumps(key_parts, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        return StageCacheView(self, name, key)
+
+    def get(self, stage, key, read):
+        # `read(path)` of the entry directory, None if there is no entry
+        path = Path(self.cache_dir, stage, key)
+
+        # Entries may be evicted by another process at any time. Memory
+        # mapped files stay readable once opened.
+        try:
+            value = read(path)
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return value
+
+    def put(self, stage, key, write):
+        # Stores the files `write(path)` creates in an empty directory
+        path = Path(self.cache_dir, stage, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Written to a unique temporary directory then renamed, so readers
+        # never see a partial entry and processes storing the same entry at
+        # once do not write into each other's files
+        tmp_path = tempfile.mkdtemp(dir=path.parent, prefix=f"{key}.", suffix=".tmp")
+        try:
+            write(Path(tmp_path))
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                # Stored by another process in the meantime
+                if not path.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in self.cache_dir.glob("*/*"):
+            if entry.suffix == ".tmp":
+                continue
+
+            # Pickle files of older versions are evicted like entries
+            try:
+                stat = entry.stat()
+                files = entry.iterdir() if entry.is_dir() else [entry]
+                size = sum(path.stat().st_size for path in files)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, size, entry))
+        total_size = sum(size for _, size, _ in entries)
+
+        for _, size, entry in sorted(entries, key=lambda x: x[0]):
+            if total_size <= self.max_size_bytes:
+                break
+
+            logging.debug("Evicting cache entry: %s", entry)
+            if entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entry.unlink(missing_ok=True)
+            total_size -= size
+
+
+class StageCacheView:
+    # The entries of one stage for one set of inputs, addressed by chunk.
+    # A chunk entry holds the results, written and read by the stage, and
+    # the pickled stage state at the end of the chunk.
+    def __init__(self, cache, stage, key) -> None:
+        self.cache = cache
+        self.stage = stage
+        self.key = key
+        self.chunk_size = cache.chunk_size
+
+    def get(self, chunk_num, load):
+        # (results, state) of a stored chunk, with the results read by
+        # `load(path)`. The state is returned pickled, it is only needed to
+        # compute the chunk after it.
+        def read(path):
+            state = Path(path, "state.pkl").read_bytes()
+            return load(path), state
+
+        return self.cache.get(self.stage, f"{self.key}_{chunk_num}", read)
+
+    def put(self, chunk_num, save, results, state):
+        # Stores `results` with `save(path, results)` and the stage state
+        def write(path):
+            save(path, results)
+            Path(path, "state.pkl").write_bytes(pickle.dumps(state))
+
+        self.cache.put(self.stage, f"{self.key}_{chunk_num}", write)
+
+    def iter_chunks(self, items, process, get_state, set_state, save, load):
+        # Yields (item, result) pairs for a sequential stage. `process` maps
+        # an iterable of items to (item, result) pairs and `load` reads the
+        # results of a stored chunk as a sequence. Cached chunks skip
+        # `process`, computed chunks are stored with their state. The state
+        # of a cached chunk is only restored when the next chunk has to be
+        # computed, a fully cached run never unpickles anything.
+        items = iter(items)
+        state = None
+
+        for chunk_num in itertools.count():
+            cached = self.get(chunk_num, load)
+
+            if cached is not None:
+                logging.debug("Cache hit: %s chunk %d", self.stage, chunk_num)
+                results, state = cached
+
+                # Results first, so no item is consumed past the chunk
+                for result, item in zip(results, items):
+                    yield item, result
+            else:
+                if state is not None:
+                    set_state(pickle.loads(state))
+                    state = None
+
+                # `save` only gets to the results at the end of the chunk,
+                # it must ignore what later stages added to them
+                results = []
+                for item, result in process(itertools.islice(items, self.chunk_size)):
+                    results.append(result)
+                    yield item, result
+
+                if not results:
+                    return
+
+                self.put(chunk_num, save, results, get_state())
+
+            if len(results) < self.chunk_size:
+                return
@@ -0,0 +1,76 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_ITEM, _DONE, _ERROR = range(3)
+
+
+class StagedExecutor:
+    # Connects pipeline stages with bounded queues. `source` moves an
+    # iterable (e.g. decoding or inference) onto its own thread and `map`
+    # fans work out to a thread pool while keeping the input order. A full
+    # queue blocks the upstream stage, so at most `queue_size` items wait
+    # between two stages.
+    def __init__(self, queue_size: int = 16, num_workers: int = 4) -> None:
+        self.queue_size = queue_size
+        self.num_workers = num_workers
+
+    @staticmethod
+    def _put(items, item, stop):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def source(self, iterable):
+        items = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for item in iterable:
+                    if not self._put(items, (_ITEM, item), stop):
+                        return
+            except BaseException as error:
+                self._put(items, (_ERROR, error), stop)
+                return
+
+            self._put(items, (_DONE, None), stop)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                kind, item = items.get()
+
+                if kind == _DONE:
+                    return
+                if kind == _ERROR:
+                    raise item
+
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+    def map(self, func, iterable, num_workers=None):
+        # With num_workers=1 items are processed one at a time in order,
+        # which suits stateful stages such as camera movement.
+        num_workers = num_workers or self.num_workers
+
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            pending = deque()
+
+            for item in iterable:
+                pending.append(pool.submit(func, item))
+
+                if len(pending) >= self.queue_size:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from .video_utils import iter_video, get_frame_count
+
+
+class VideoSource:
+    # The frames of a video as a read-only sequence, decoded on access
+    # instead of all at once like read_video. Indexing seeks the capture,
+    # or reads forward when the frame is at most `max_skip` frames ahead,
+    # and keeps the last `cache_size` decoded frames (LRU). With `prefetch`
+    # a background thread keeps that many frames after the last access
+    # decoded, for consumers indexing in order.
+    # Indexed frames are shared with the cache, copy them before drawing.
+    # Iterating decodes the whole video sequentially and bypasses the cache.
+    #
+    # len() comes from the container header, which is approximate for some
+    # codecs. Frames past the real end raise IndexError.
+    def __init__(
+        self,
+        video_path,
+        cache_size: int = 8,
+        prefetch: int = 0,
+        max_skip: int = 16,
+    ) -> None:
+        self.video_path = str(video_path)
+        # Room for the prefetched frames on top of the recently used ones
+        self.cache_size = cache_size + prefetch
+        self.prefetch = prefetch
+        self.max_skip = max_skip
+
+        self.num_frames = get_frame_count(self.video_path)
+
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Index of the frame the next cap.read() returns
+        self.cap = None
+        self.position = 0
+
+        self.executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self.prefetching = None
+        self.last_index = None
+
+    def __len__(self):
+        return self.num_frames
+
+    def __iter__(self):
+        return iter_video(self.video_path)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Frame index out of range")
+
+        with self.lock:
+            frame = self.read(index)
+
+        if frame is None:
+            raise IndexError(f"Could not decode frame {index}")
+
+        if self.prefetch:
+            self.last_index = index
+            self.start_prefetch(index + 1)
+
+        return frame
+
+    def read(self, frame_num):
+        # Decoded frame `frame_num` or None past the end, the lock must be
+        # held
+        frame = self.cache.get(frame_num)
+        if frame is not None:
+            self.cache.move_to_end(frame_num)
+            return frame
+
+        if self.cap is None:
+            self.cap = cv2.VideoCapture(self.video_path)
+            self.position = 0
+
+        if self.position <= frame_num <= self.position + self.max_skip:
+            while self.position < frame_num:
+                self.cap.grab()
+                self.position += 1
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+
+        ret, frame = self.cap.read()
+        if not ret:
+            # Position unknown, the next read seeks
+            self.position = -self.max_skip - 2
+            return None
+        self.position = frame_num + 1
+
+        self.cache[frame_num] = frame
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return frame
+
+    def start_prefetch(self, start):
+        # One prefetch runs at a time, it follows later accesses itself
+        if self.prefetching is not None and not self.prefetching.done():
+            return
+
+        self.prefetching = self.executor.submit(self.prefetch_frames, start)
+
+    def prefetch_frames(self, start):
+        frame_num = start
+
+        while True:
+            last_index = self.last_index
+
+            # Done once the frames after the last access are decoded, start
+            # over after it when indexing has moved elsewhere
+            if frame_num == last_index + self.prefetch + 1:
+                return
+            if not last_index < frame_num <= last_index + self.prefetch:
+                frame_num = last_index + 1
+            if frame_num >= len(self):
+                return
+
+            # Released between frames, so indexing is never blocked long
+            with self.lock:
+                if frame_num not in self.cache and self.read(frame_num) is None:
+                    return
+
+            frame_num += 1
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+        with self.lock:
+            if self.cap is not None:
+                self.cap.release()
+                self.cap = None
+            self.cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,31 +1,58 @@
 import cv2
 
 
-def read_video(video_path: str):
-    cap = cv2.VideoCapture(video_path)
+def iter_video(video_path: str, start: int = 0, stop: int | None = None):
+    # Frames [start, stop) of the video, decoded one at a time
+    cap = cv2.VideoCapture(str(video_path))
+
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    try:
+        frame_num = start
+        while stop is None or frame_num < stop:
+            ret, frame = cap.read()
 
-    frames = []
+            if not ret:
+                break
 
-    while True:
-        ret, frame = cap.read()
+            frame_num += 1
+            yield frame
+    finally:
+        cap.release()
 
-        if not ret:
-            break
 
-        frames.append(frame)
-    return frames
+def read_video(video_path: str):
+    return list(iter_video(video_path))
+
+
+def get_frame_count(video_path: str):
+    # From the container header, may be approximate for some codecs
+    cap = cv2.VideoCapture(str(video_path))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    return frame_count
 
 
 def save_video(output_video_frames, output_video_path):
+    # Accepts a list or any iterable (e.g. a generator) of frames.
+    frames = iter(output_video_frames)
+    first_frame = next(frames, None)
+
+    if first_frame is None:
+        return
+
     fourcc = cv2.VideoWriter.fourcc(*"XVID")
 
-    WIDTH = output_video_frames[0].shape[1]
-    HEIGHT = output_video_frames[0].shape[0]
+    WIDTH = first_frame.shape[1]
+    HEIGHT = first_frame.shape[0]
 
     FPS = 24
 
     out = cv2.VideoWriter(output_video_path, fourcc, FPS, (WIDTH, HEIGHT))
 
-    for frame in output_video_frames:
+    out.write(first_frame)
+    for frame in frames:
         out.write(frame)
     out.release()
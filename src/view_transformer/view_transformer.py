@@ -38,17 +38,58 @@ class ViewTransformer:
 
         return transform_point.reshape(-1, 2)
 
+    def is_inside(self, points):
+        # Vectorized equivalent of `cv2.pointPolygonTest(...) >= 0` on the
+        # truncated points. pixel_vertices form a convex quadrilateral, so a
+        # point is inside (or on an edge) when it lies on the same side of
+        # every edge.
+        points = np.trunc(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+
+        vertices = self.pixel_vertices.astype(np.float64)
+        edges = np.roll(vertices, -1, axis=0) - vertices
+
+        relative = points[:, None, :] - vertices[None, :, :]
+        cross = (
+            edges[None, :, 0] * relative[:, :, 1]
+            - edges[None, :, 1] * relative[:, :, 0]
+        )
+
+        return np.all(cross >= 0, axis=1) | np.all(cross <= 0, axis=1)
+
+    def transform_points(self, points):
+        # Batched transform_point over an (N, 2) array, points outside the
+        # trapezoid are NaN
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        points_transformed = np.full_like(points, np.nan)
+
+        is_inside = self.is_inside(points)
+        if np.any(is_inside):
+            points_transformed[is_inside] = cv2.perspectiveTransform(
+                points[is_inside].reshape(-1, 1, 2), self.perspective_transformer
+            ).reshape(-1, 2)
+
+        return points_transformed
+
     def add_transformed_position_to_tracks(self, tracks):
         for object, object_tracks in tracks.items():
-            for frame_num, track in enumerate(object_tracks):
-                for track_id, track_info in track.items():
-                    position = track_info["position_adjusted"]
-                    position = np.array(position)
-                    position_transformed = self.transform_point(position)
-
-                    if position_transformed is not None:
-                        position_transformed = position_transformed.squeeze().tolist()
-
-                    tracks[object][frame_num][track_id][
-                        "position_transformed"
-                    ] = position_transformed
+            track_infos = [
+                track_info for track in object_tracks for track_info in track.values()
+            ]
+            if not track_infos:
+                continue
+
+            positions = [track_info["position_adjusted"] for track_info in track_infos]
+            positions_transformed = self.transform_points(positions)
+            is_inside = ~np.isnan(positions_transformed[:, 0])
+
+            for track_info, position_transformed, inside in zip(
+                track_infos, positions_transformed.tolist(), is_inside.tolist()
+            ):
+                track_info["position_transformed"] = (
+                    position_transformed if inside else None
+                )
+
+    def add_transformed_position_to_track_table(self, track_table):
+        track_table.position_transformed = self.transform_points(
+            track_table.position_adjusted
+        )
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from src.utils import iter_video
+from src.camera_movement_estimator import CameraMovementEstimator
+from benchmarks.synthetic import make_synthetic_video
+
+# Largest allowed per-frame difference in pixels
+TOLERANCE = 0.5
+
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory):
+    # Wide enough for both feature mask strips of CameraMovementEstimator
+    return make_synthetic_video(
+        tmp_path_factory.mktemp("video") / "synthetic.avi",
+        width=1280,
+        height=720,
+        num_frames=48,
+        num_players=6,
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [7, 16])
+def test_parallel_matches_sequential(video_path, chunk_size):
+    camera_movement_estimator = CameraMovementEstimator(next(iter_video(video_path)))
+
+    sequential = camera_movement_estimator.get_camera_movement(iter_video(video_path))
+    parallel = camera_movement_estimator.get_camera_movement_parallel(
+        video_path, num_workers=2, chunk_size=chunk_size
+    )
+
+    sequential = np.asarray(sequential, dtype=np.float64).reshape(-1, 2)
+    parallel = np.asarray(parallel, dtype=np.float64).reshape(-1, 2)
+
+    assert parallel.shape == sequential.shape
+    assert np.abs(sequential - parallel).max() <= TOLERANCE
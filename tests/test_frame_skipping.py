@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from src.main import main
+from src.trackers import Tracker, TrackTable
+from src.utils import read_video
+from src.camera_movement_estimator import CameraMovementEstimator
+from benchmarks.synthetic import StubDetector, make_synthetic_video
+
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory):
+    # Full HD, where ByteTrack drops every track between sparse detections
+    # without camera compensation
+    return make_synthetic_video(
+        tmp_path_factory.mktemp("video") / "synthetic.avi", num_frames=60
+    )
+
+
+def get_player_rows(video_frames, camera_movements, detect_every):
+    tracker = Tracker("stub", detect_every=detect_every, model=StubDetector())
+    tracks = tracker.get_object_tracks(video_frames, camera_movements=camera_movements)
+
+    return len(TrackTable.from_tracks(tracks).object_rows("players"))
+
+
+@pytest.mark.parametrize("detect_every", [2, 3, 5])
+def test_tracks_survive_skipped_frames(video_path, detect_every):
+    video_frames = read_video(video_path)
+    camera_movements = CameraMovementEstimator(video_frames[0]).get_camera_movement(
+        video_frames
+    )
+
+    rows = get_player_rows(video_frames, camera_movements, 1)
+    skipped_rows = get_player_rows(video_frames, camera_movements, detect_every)
+
+    # Players are tracked on most of the detected frames
+    assert skipped_rows >= 0.75 * rows / detect_every
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_main_with_frame_skipping(video_path, tmp_path, streaming):
+    tracker = Tracker("stub", detect_every=5, model=StubDetector())
+
+    main(
+        video_path=str(video_path),
+        streaming=streaming,
+        use_cache=False,
+        headless=True,
+        export_formats=("json",),
+        save_dir=tmp_path,
+        tracker=tracker,
+    )
+
+    with open(tmp_path / "profile.json") as f:
+        profile = json.load(f)
+    assert profile["stages"]["ball_assignment"]["items"] == 60
@@ -0,0 +1,51 @@
+import pytest
+
+from src.trackers import TrackTable
+from src.player_ball_assigner import PlayerBallAssigner
+
+PLAYERS = {
+    1: {"bounding_box": [0, 0, 20, 100]},
+    2: {"bounding_box": [500, 0, 520, 100]},
+}
+
+# Ball at the feet of a player, or out of reach of both
+BALL_POSITIONS = {1: [5, 95, 15, 105], 2: [505, 95, 515, 105], -1: [250, 295, 260, 305]}
+
+
+def get_track_table(ball_near):
+    return TrackTable.from_tracks(
+        {
+            "players": [PLAYERS for _ in ball_near],
+            "referees": [{} for _ in ball_near],
+            "ball": [{1: {"bounding_box": BALL_POSITIONS[near]}} for near in ball_near],
+        }
+    )
+
+
+def get_ball_holders(ball_near, min_hold_frames):
+    track_table = get_track_table(ball_near)
+    assigned_rows = PlayerBallAssigner(
+        min_hold_frames=min_hold_frames
+    ).assign_ball_to_players(track_table)
+
+    return [
+        track_table.track_id[row].item() if row >= 0 else -1 for row in assigned_rows
+    ]
+
+
+@pytest.mark.parametrize(
+    "ball_near, expected",
+    [
+        # Player 2 is closest for two frames in a row and takes the ball
+        ([1, 1, 2, 2, 2], [1, 1, 1, 2, 2]),
+        # A frame with nobody in reach breaks the streak of player 2
+        ([1, 1, 2, -1, 2, 1], [1, 1, 1, -1, 1, 1]),
+        ([-1, 2, 1, 1], [-1, 2, 2, 1]),
+    ],
+)
+def test_hold_frames(ball_near, expected):
+    assert get_ball_holders(ball_near, min_hold_frames=2) == expected
+
+
+def test_single_hold_frame_follows_closest_player():
+    assert get_ball_holders([1, 2, -1, 1], min_hold_frames=1) == [1, 2, -1, 1]
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from src.possession_stats import PossessionStats
+
+
+def test_rolling_possession():
+    stats = PossessionStats([1, 1, 2, 0, 2])
+
+    np.testing.assert_allclose(
+        stats.rolling_possession(2),
+        [[100, 0], [100, 0], [50, 50], [0, 100], [0, 100]],
+    )
+
+
+@pytest.mark.parametrize("window", [0, -1])
+def test_rolling_possession_rejects_empty_window(window):
+    with pytest.raises(ValueError, match="at least 1 frame"):
+        PossessionStats([1, 2]).rolling_possession(window)
@@ -0,0 +1,23 @@
+from src.trackers import Tracker
+from benchmarks.synthetic import StubDetector
+
+
+def get_segment(boxes):
+    # One player per frame with the given boxes
+    return {
+        "players": [{1: {"bounding_box": box}} for box in boxes],
+        "referees": [{} for _ in boxes],
+        "ball": [{} for _ in boxes],
+    }
+
+
+def test_merge_segment_shorter_than_overlap():
+    tracker = Tracker("stub", model=StubDetector())
+    boxes = [[10 * i, 0, 10 * i + 50, 100] for i in range(6)]
+
+    tracks = tracker.merge_segment_tracks(
+        [0, 2], [get_segment(boxes), get_segment(boxes[2:4])]
+    )
+
+    assert len(tracks["players"]) == 6
+    assert [list(frame_tracks) for frame_tracks in tracks["players"]] == [[1]] * 6